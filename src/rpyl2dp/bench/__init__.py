@@ -0,0 +1,3 @@
+from .fake import FakeParameter, FakeRenpyModel, fake_common
+from .synth import generate_model
+from .run import run_benchmarks
@@ -0,0 +1,36 @@
+from ..standin import FakeParameter, fake_common
+
+# Class standing in for a Ren'Py Live2D model. Blend calls are counted and, if recording, kept in order.
+class FakeRenpyModel:
+    def __init__(self, parameters: dict | list, record: bool=True):
+        if isinstance(parameters, list):
+            parameters = {id: 0.0 for id in parameters}
+        elif not isinstance(parameters, dict):
+            raise TypeError('Parameters must be a dict or a list')
+        if not isinstance(record, bool):
+            raise TypeError('Record must be a bool')
+        self.common = fake_common(parameters)
+        self.record: bool = record
+        self.calls: list[tuple[str, str, str, float]] = list()
+        self.parameter_calls: int = 0
+        self.opacity_calls: int = 0
+        return
+
+    def blend_parameter(self, id: str, blend: str, value: float) -> None:
+        self.parameter_calls += 1
+        if self.record:
+            self.calls.append(('Parameter', id, blend, value))
+        return
+
+    def blend_opacity(self, id: str, blend: str, value: float) -> None:
+        self.opacity_calls += 1
+        if self.record:
+            self.calls.append(('PartOpacity', id, blend, value))
+        return
+
+    # Forget every recorded call
+    def clear(self) -> None:
+        self.calls.clear()
+        self.parameter_calls = 0
+        self.opacity_calls = 0
+        return
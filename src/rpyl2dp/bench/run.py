@@ -0,0 +1,145 @@
+from pathlib import Path
+import argparse
+import json
+import platform
+import random
+import statistics
+import tempfile
+import time
+
+from .. import rpyl2dp as l2d
+from .fake import FakeRenpyModel
+from .synth import generate_model
+
+sizes: dict = {
+    'small': {'motions': 5, 'curves': 10, 'keyframes': 20},
+    'medium': {'motions': 10, 'curves': 60, 'keyframes': 100},
+    'large': {'motions': 10, 'curves': 120, 'keyframes': 400},
+}
+
+# Call a function repeatedly and return its timings in microseconds
+# The first calls are not timed so lazily built data such as curve tables does not count
+def measure(function, iterations: int, warmup: int=0) -> dict:
+    clock = time.perf_counter
+    for i in range(warmup):
+        function()
+    samples = list()
+    for i in range(iterations):
+        start = clock()
+        function()
+        samples.append(clock() - start)
+    return {'Iterations': iterations,
+            'Mean us': 1e6 * statistics.fmean(samples),
+            'Median us': 1e6 * statistics.median(samples),
+            'Min us': 1e6 * min(samples)}
+
+# Benchmark load_model, eagerly and lazily
+def bench_load_model(game_dir: str, file_name: str, iterations: int) -> list[dict]:
+    results = list()
+    for lazy in (False, True):
+        timings = measure(lambda: l2d.load_model(game_dir, file_name, lazy=lazy), iterations)
+        results.append({'Benchmark': 'load_model lazy' if lazy else 'load_model', **timings})
+    return results
+
+# Benchmark second at random points in every motion
+def bench_second(model: l2d.Model, iterations: int, rng: random.Random) -> list[dict]:
+    names = model.motion_names()
+    def call():
+        motion_name = names[rng.randrange(len(names))]
+        model.second(motion_name, rng.uniform(0.0, model.get_motion(motion_name).duration))
+    return [{'Benchmark': 'second', **measure(call, iterations, 10 * len(names))}]
+
+# Benchmark update with a looping exclusive motion, two inclusive motions and an expression
+def bench_update(model: l2d.Model, renpy_model: FakeRenpyModel, iterations: int) -> list[dict]:
+    names = model.motion_names()
+    model.reset()
+    model.exclusive_push(names[0], loop=True)
+    model.inclusive_add(names[1 % len(names)], 0.5, 2.0)
+    model.inclusive_add(names[2 % len(names)], 0.0, 0.0)
+    expressions = model.expression_names()
+    if len(expressions) > 0:
+        model.expression_add(expressions[0], 0.5)
+    frame = [0]
+    def call():
+        model.update(renpy_model, frame[0] / l2d.FPS)
+        frame[0] += 1
+        renpy_model.clear()
+    return [{'Benchmark': 'update', **measure(call, iterations, iterations // 10)}]
+
+# Benchmark transition_and_push from a pose set by an exclusive motion, with and without crossfade
+def bench_transition_and_push(model: l2d.Model, renpy_model: FakeRenpyModel, iterations: int) -> list[dict]:
+    names = model.motion_names()
+    results = list()
+    for crossfade in (False, True):
+        model.reset()
+        model.exclusive_push(names[0], loop=False)
+        for i in range(3):
+            model.update(renpy_model, i / l2d.FPS)
+        count = [0]
+        def call():
+            model.transition_and_push(names[count[0] % len(names)], crossfade=crossfade)
+            count[0] += 1
+        benchmark = 'transition_and_push crossfade' if crossfade else 'transition_and_push'
+        results.append({'Benchmark': benchmark, **measure(call, iterations)})
+    model.reset()
+    return results
+
+# Benchmark fade_and_add, alternating between fading an expression in and out
+def bench_fade_and_add(model: l2d.Model, renpy_model: FakeRenpyModel, iterations: int) -> list[dict]:
+    expressions = model.expression_names()
+    if len(expressions) <= 0:
+        return list()
+    model.reset()
+    count = [0]
+    def call():
+        model.fade_and_add(renpy_model, expressions[count[0] % len(expressions)], 'bezier', 0.5, count[0] % 2 == 1)
+        count[0] += 1
+    results = [{'Benchmark': 'fade_and_add', **measure(call, iterations)}]
+    model.reset()
+    return results
+
+# Run every benchmark at the given sizes. Returns the results as a dict ready to be written as JSON.
+def run_benchmarks(size_names: list[str] | None=None, iterations: int=1000, seed: int=0) -> dict:
+    if size_names is None:
+        size_names = list(sizes)
+    output: dict = {'Python': platform.python_version(),
+                    'NumPy': None if l2d.numpy is None else l2d.numpy.__version__,
+                    'NumPy backend': l2d.numpy_backend,
+                    'FPS': l2d.FPS,
+                    'Seed': seed,
+                    'Results': list()}
+    for size_name in size_names:
+        size = sizes[size_name]
+        with tempfile.TemporaryDirectory() as game_dir:
+            parameter_ids = generate_model(game_dir, 'bench', seed=seed, **size)
+            renpy_model = FakeRenpyModel(parameter_ids, record=False)
+            model = l2d.load_model(game_dir, 'bench')
+            rng = random.Random(seed)
+            model.seed_random(seed)
+            results = list()
+            results += bench_load_model(game_dir, 'bench', max(1, iterations // 100))
+            results += bench_second(model, iterations, rng)
+            results += bench_update(model, renpy_model, iterations)
+            results += bench_transition_and_push(model, renpy_model, iterations)
+            results += bench_fade_and_add(model, renpy_model, iterations)
+        for result in results:
+            output['Results'].append({'Size': size_name, **size, **result})
+    return output
+
+def main(argv: list[str] | None=None) -> None:
+    parser = argparse.ArgumentParser(prog='python -m rpyl2dp.bench', description='Run the rpyl2dp benchmarks without Ren\'Py')
+    parser.add_argument('--sizes', nargs='+', choices=list(sizes), default=list(sizes))
+    parser.add_argument('--iterations', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-numpy', action='store_true', help='evaluate curves in pure Python')
+    parser.add_argument('--output', type=Path, help='write the results to this JSON file')
+    args = parser.parse_args(argv)
+    if args.no_numpy:
+        l2d.set_numpy_backend(False)
+    output = run_benchmarks(args.sizes, args.iterations, args.seed)
+    for result in output['Results']:
+        print(f"{result['Size']:<8} {result['Benchmark']:<30} {result['Mean us']:>12.1f} us")
+    if args.output is not None:
+        with open(args.output, 'w') as file:
+            json.dump(output, file, indent=4)
+    return
@@ -0,0 +1,59 @@
+from pathlib import Path
+import json
+import random
+
+# Returns the segments of one random curve in motion3 layout
+def generate_segments(rng: random.Random, duration: float, keyframes: int, bezier_ratio: float) -> list[float]:
+    segments = [0.0, rng.uniform(-1.0, 1.0)]
+    start = 0.0
+    for i in range(1, keyframes):
+        # Keyframes are roughly evenly spaced with some jitter, and the last one lands on the end of the motion
+        if i == keyframes - 1:
+            end = duration
+        else:
+            end = duration * (i + rng.uniform(-0.3, 0.3)) / (keyframes - 1)
+        value = rng.uniform(-1.0, 1.0)
+        if rng.random() < bezier_ratio:
+            # Handles at a third and two thirds of the segment, as exported by Cubism with restricted beziers
+            length = end - start
+            segments += [1.0, start + length/3, rng.uniform(-1.0, 1.0), start + length*2/3, rng.uniform(-1.0, 1.0), end, value]
+        else:
+            segments += [0.0, end, value]
+        start = end
+    return segments
+
+# Write a synthetic Live2D model folder to game_dir/live2d/file_name. Returns the parameter ids used by its curves.
+def generate_model(game_dir: str | Path, file_name: str, motions: int=10, curves: int=60, keyframes: int=100,
+                   bezier_ratio: float=0.5, parts: int=2, expressions: int=5, expression_parameters: int=8,
+                   min_duration: float=2.0, max_duration: float=6.0, seed: int=0) -> list[str]:
+    if keyframes < 2:
+        raise ValueError('Curves must have at least 2 keyframes')
+    elif not 0.0 <= bezier_ratio <= 1.0:
+        raise ValueError('Bezier ratio must be between 0 and 1')
+    rng = random.Random(seed)
+    live2d_path = Path(game_dir) / 'live2d' / file_name
+    motions_dir = live2d_path / 'Motions'
+    expressions_dir = live2d_path / 'Expressions'
+    motions_dir.mkdir(parents=True, exist_ok=True)
+    expressions_dir.mkdir(parents=True, exist_ok=True)
+    (live2d_path / (file_name + '.model3.json')).write_text(json.dumps({'Version': 3, 'FileReferences': {}}))
+    parameter_ids = [f'Param{i}' for i in range(curves)]
+
+    for i in range(motions):
+        duration = rng.uniform(min_duration, max_duration)
+        data_curves = list()
+        for id in parameter_ids:
+            data_curves.append({'Target': 'Parameter', 'Id': id, 'Segments': generate_segments(rng, duration, keyframes, bezier_ratio)})
+        for j in range(parts):
+            data_curves.append({'Target': 'PartOpacity', 'Id': f'Part{j}', 'Segments': generate_segments(rng, duration, 3, 0.0)})
+        data = {'Version': 3, 'Meta': {'Duration': duration, 'Fps': 30.0, 'Loop': True, 'AreBeziersRestricted': True,
+                                       'CurveCount': len(data_curves)}, 'Curves': data_curves}
+        (motions_dir / f'motion{i}.motion3.json').write_text(json.dumps(data))
+
+    for i in range(expressions):
+        parameters = list()
+        for id in rng.sample(parameter_ids, min(expression_parameters, len(parameter_ids))):
+            parameters.append({'Id': id, 'Value': rng.uniform(-1.0, 1.0), 'Blend': rng.choice(['Add', 'Overwrite'])})
+        (expressions_dir / f'expression{i}.exp3.json').write_text(json.dumps({'Type': 'Live2D Expression', 'Parameters': parameters}))
+
+    return parameter_ids
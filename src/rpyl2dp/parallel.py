@@ -0,0 +1,248 @@
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from pathlib import Path
+import os
+import tempfile
+
+from . import rpyl2dp as l2d
+
+# Motion packs a worker has mapped and the motions it has read from them, kept for the life of the worker so later jobs
+# do not read them again
+worker_packs: dict = dict()
+worker_motions: dict = dict()
+
+# Settings of this process that change what a motion evaluates to. Workers take them on before running any job
+def current_settings() -> dict:
+    cache = l2d.bake_cache
+    return {'FPS': l2d.FPS,
+            'NumPy backend': l2d.numpy_backend,
+            'NumPy min curves': l2d.numpy_min_curves,
+            'Bezier time iterations': l2d.bezier_time_iterations,
+            'Bake cache': None if cache is None else (cache.budget, cache.samples_per_frame, cache.interpolate)}
+
+# Set up a worker process with the settings of the process that started it. Workers have a bake cache of their own, so
+# baked motions evaluate to the same values they would here
+def init_worker(settings: dict) -> None:
+    l2d.FPS = settings['FPS']
+    l2d.set_numpy_backend(settings['NumPy backend'], settings['NumPy min curves'])
+    l2d.bezier_time_iterations = settings['Bezier time iterations']
+    cache = settings['Bake cache']
+    l2d.set_bake_cache(None if cache is None else l2d.BakeCache(*cache))
+    worker_packs.clear()
+    worker_motions.clear()
+    return
+
+# Describe the motions jobs need so a worker can get them. Each entry is a model, a motion name and the motion.
+# Motions read from a motion pack are mapped from that pack by the workers. Every other motion is written once to a
+# temporary motion pack at the given path, so its curves are mapped by the workers too instead of being sent to each of
+# them. Jobs run in this process use the motions themselves. Returns a spec for each entry
+def motion_specs(entries: list[tuple], workers: int, file_path: Path) -> list[tuple]:
+    if workers <= 0:
+        return [('Motion', motion, motion_name, motion.bake) for (model, motion_name, motion) in entries]
+    specs = list()
+    written = list()
+    for (model, motion_name, motion) in entries:
+        source = model.motion_files.get(motion_name)
+        if isinstance(source, l2d.MotionPack) and motion_name not in model.synthetic_motions:
+            specs.append(('Pack', str(source.path), motion_name, motion.bake))
+            continue
+        # Motions of different models can have the same name, so they are given numbers in the temporary pack instead
+        compiled = l2d.Motion(str(len(written)), motion.duration, list(), motion.compiled)
+        compiled.constants = motion.constants
+        compiled.simplified = motion.simplified
+        specs.append(('Pack', str(file_path), compiled.name, motion.bake))
+        written.append(compiled)
+    if len(written) > 0:
+        l2d.write_pack(written, file_path)
+    return specs
+
+# Get the motion a spec describes
+def worker_motion(spec: tuple) -> l2d.Motion:
+    (kind, source, motion_name, bake) = spec
+    if kind != 'Pack':
+        return source
+    key = (source, motion_name)
+    motion = worker_motions.get(key)
+    if motion is None:
+        pack = worker_packs.get(source)
+        if pack is None:
+            pack = l2d.MotionPack(source)
+            worker_packs[source] = pack
+        motion = pack.load(motion_name)
+        motion.bake = bake
+        worker_motions[key] = motion
+    return motion
+
+# Share jobs out into about the given number of parts, keeping the total weight of each part close
+def share(jobs: list, weights: list[int], parts: int) -> list[list]:
+    limit = max(1, -(-sum(weights) // max(1, parts)))
+    shares: list = [list()]
+    weight = 0
+    for job, job_weight in zip(jobs, weights):
+        if weight + job_weight > limit and len(shares[-1]) > 0:
+            shares.append(list())
+            weight = 0
+        shares[-1].append(job)
+        weight += job_weight
+    return shares
+
+# Run a job function on every share, in a pool of worker processes or in this process if there are no workers.
+# Every job writes its results into the shared memory buffer with the given name
+def run(function, buffer_name: str, shares: list[list], workers: int) -> None:
+    shares = [jobs for jobs in shares if len(jobs) > 0]
+    if len(shares) <= 0:
+        return
+    elif workers <= 0:
+        for jobs in shares:
+            function(buffer_name, jobs)
+        return
+    with ProcessPoolExecutor(max_workers=min(workers, len(shares)), initializer=init_worker, initargs=(current_settings(),)) as pool:
+        for future in [pool.submit(function, buffer_name, jobs) for jobs in shares]:
+            # Raises any error a job raised
+            future.result()
+    return
+
+# Returns the number of workers to use, which is one per core if not given
+def worker_count(workers: int | None) -> int:
+    if workers is None:
+        return os.cpu_count() or 1
+    elif not isinstance(workers, int):
+        raise TypeError('Workers must be an int')
+    elif workers < 0:
+        raise ValueError('Workers must not be negative')
+    return workers
+
+# Job run by a worker. Evaluates motions at each of their seconds and writes the values into the shared buffer of doubles
+# at the given offsets, in the same order as Model.second
+def evaluate_job(buffer_name: str, jobs: list) -> int:
+    memory = shared_memory.SharedMemory(name=buffer_name)
+    try:
+        output = memory.buf.cast('d')
+        try:
+            count = 0
+            for (spec, rows) in jobs:
+                motion = worker_motion(spec)
+                constants = [value for (target, id, value) in motion.constants]
+                width = len(motion.compiled) + len(constants)
+                for (offset, st) in rows:
+                    output[offset:offset + width] = array('d', motion.values(st) + constants)
+                    count += 1
+        finally:
+            output.release()
+    finally:
+        memory.close()
+    return count
+
+# Job run by a worker. Bakes motions and writes each table into the shared buffer of floats at the given offset
+def bake_job(buffer_name: str, jobs: list) -> int:
+    memory = shared_memory.SharedMemory(name=buffer_name)
+    try:
+        output = memory.buf.cast('f')
+        try:
+            for (spec, rate, offset) in jobs:
+                table = l2d.BakedMotion(worker_motion(spec), rate).table
+                output[offset:offset + len(table)] = table
+        finally:
+            output.release()
+    finally:
+        memory.close()
+    return len(jobs)
+
+# Find the value of every parameter of many motions at many seconds, sharing the work between worker processes.
+# Each request is a model, the name of one of its motions and a second. Returns the values of each request in the same
+# order as Model.second, without the targets and ids, and they are the same values Model.second gives.
+# Values are written by the workers straight into shared memory, so only the names of motions and the seconds are sent
+# to the workers and nothing is sent back. Models that load their motions through the motion library share them, so each
+# shared motion is only written once. With no workers, every request is evaluated in this process
+def evaluate_seconds(requests: list[tuple], workers: int | None=None) -> list[list[float]]:
+    workers = worker_count(workers)
+    # Requests are grouped by motion
+    groups: dict = dict()
+    offsets = list()
+    total = 0
+    for (model, motion_name, st) in requests:
+        if not isinstance(model, l2d.Model):
+            raise TypeError('Model must be a Model')
+        elif not isinstance(motion_name, str):
+            raise TypeError('Motion name must be a string')
+        elif not (isinstance(st, float) or isinstance(st, int)):
+            raise TypeError('Seconds must be a float')
+        elif not model.has_motion(motion_name):
+            raise KeyError(f'No motion with the name "{motion_name}" associated with model "{model.name}"')
+        motion = model.get_motion(motion_name)
+        group = groups.get(id(motion))
+        if group is None:
+            group = ((model, motion_name, motion), list())
+            groups[id(motion)] = group
+        width = len(motion.compiled) + len(motion.constants)
+        group[1].append((total, float(st)))
+        offsets.append((total, width))
+        total += width
+    with tempfile.TemporaryDirectory() as directory:
+        specs = motion_specs([entry for (entry, rows) in groups.values()], workers, Path(directory) / 'motions.l2dpack')
+        # Motions asked for at many seconds are split so they can be shared between workers too
+        size = max(1, -(-len(requests) // max(1, 4 * workers)))
+        jobs = [(spec, rows[start:start + size]) for spec, (entry, rows) in zip(specs, groups.values())
+                for start in range(0, len(rows), size)]
+        memory = shared_memory.SharedMemory(create=True, size=8 * max(1, total))
+        try:
+            run(evaluate_job, memory.name, share(jobs, [len(rows) for (spec, rows) in jobs], 4 * workers), workers)
+            output = memory.buf.cast('d')
+            try:
+                values = [output[offset:offset + width].tolist() for (offset, width) in offsets]
+            finally:
+                output.release()
+        finally:
+            memory.close()
+            memory.unlink()
+    return values
+
+# Bake every motion of the given models into the bake cache, sharing the work between worker processes. Motions are
+# also marked to be read from the bake cache, like Model.bake. Each table is the same one baking in this process makes.
+# Tables are written by the workers straight into shared memory. Motions shared by several models are baked once, and
+# motions whose table could never fit the cache are skipped. Returns the number of motions baked
+def bake_models(models: l2d.Model | list[l2d.Model], workers: int | None=None) -> int:
+    cache = l2d.bake_cache
+    if cache is None:
+        raise ValueError('No bake cache is set. Set one with set_bake_cache first')
+    if isinstance(models, l2d.Model):
+        models = [models]
+    elif not isinstance(models, list):
+        raise TypeError('Models must be a Model or a list')
+    workers = worker_count(workers)
+    rate = l2d.FPS * cache.samples_per_frame
+    itemsize = array('f').itemsize
+    entries = list()
+    tables = list()
+    baked: set = set()
+    total = 0
+    for model in models:
+        if not isinstance(model, l2d.Model):
+            raise TypeError('Model must be a Model')
+        for motion_name in model.motion_names():
+            motion = model.get_motion(motion_name)
+            motion.bake = True
+            if id(motion) in baked:
+                continue
+            baked.add(id(motion))
+            size = l2d.BakedMotion.sample_count(motion.duration, rate) * len(motion.compiled)
+            if size * itemsize > cache.budget:
+                continue
+            entries.append((model, motion_name, motion))
+            tables.append((motion, total, size))
+            total += size
+    with tempfile.TemporaryDirectory() as directory:
+        specs = motion_specs(entries, workers, Path(directory) / 'motions.l2dpack')
+        jobs = [(spec, rate, offset) for spec, (motion, offset, size) in zip(specs, tables)]
+        memory = shared_memory.SharedMemory(create=True, size=itemsize * max(1, total))
+        try:
+            run(bake_job, memory.name, share(jobs, [size for (motion, offset, size) in tables], 4 * workers), workers)
+            for (motion, offset, size) in tables:
+                table = array('f')
+                table.frombytes(memory.buf[offset * itemsize:(offset + size) * itemsize])
+                cache.add(motion, l2d.BakedMotion.from_table(motion, rate, table))
+        finally:
+            memory.close()
+            memory.unlink()
+    return len(tables)
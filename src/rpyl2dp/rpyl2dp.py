@@ -1,34 +1,467 @@
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+import hashlib
+import heapq
 import json
-import queue
+import math
+import mmap
+import os
+import pickle
 import random
+import sys
+import tempfile
+import threading
+import time
+import weakref
+
+# NumPy is optional. Without it every curve is evaluated in pure Python.
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 FPS = 30.0
 default_fade_time = 1.0
 default_transition_time = 1.0
+numpy_backend = numpy is not None
+numpy_min_curves = 16
+skip_unchanged_blends = False
+adaptive_redraw = False
+max_redraw_delay = None
+bake_cache = None
+prefetch_pool = None
+parse_cache_dir = None
+parse_cache_version = 4
+pack_magic = b'L2DPACK1'
+bezier_time_iterations = 40
+simplify_tolerance = None
+motion_library = None
+motion_budget = None
+# Target codes of curves. Blend stages compare these instead of the target strings
+target_codes = {'Model': 0, 'Parameter': 1, 'PartOpacity': 2}
 
 #######################################################################################################################
 
+# Class for a single compiled curve. Segment start times, type codes and control points are stored in flat arrays so the
+# active segment can be found with a binary search instead of walking the raw segment list.
+# Each segment is also stored as the coefficients of its x and y polynomials in t, so evaluating it is a few multiply-adds.
+# If beziers are restricted, as the AreBeziersRestricted motion3 flag says, t is taken to move linearly with time like
+# Cubism does. Otherwise t is solved for from time.
+class Curve():
+    __slots__ = ('target', 'id', 'times', 'kinds', 'offsets', 'points', 'coefficients')
+
+    def __init__(self, target: str, id: str, segments: list, restricted: bool=False):
+        if not isinstance(target, str):
+            raise TypeError('Target must be a string')
+        elif not isinstance(id, str):
+            raise TypeError('Id must be a string')
+        elif not isinstance(segments, list):
+            raise TypeError('Segments must be a list')
+        elif not isinstance(restricted, bool):
+            raise TypeError('Restricted must be a bool')
+        self.target: str = target
+        self.id: str = id
+        self.times: array = array('d')      # Start time of each segment
+        self.kinds: array = array('b')      # Type code of each segment
+        self.offsets: array = array('L')    # Index into points of the first control point after each segment's start
+        self.points: array = array('d', segments[0:2])
+        row = 2
+        while row < len(segments):
+            kind = segments[row]
+            if kind == 0 or kind == 2 or kind == 3:
+                # Linear, stepped and inverse-stepped segments have one point
+                stride = 2
+            elif kind == 1:
+                # Bezier segments have two handles and an end point
+                stride = 6
+            else:
+                raise ValueError('Unknown segment type')
+            self.times.append(self.points[-2])
+            self.kinds.append(int(kind))
+            self.offsets.append(len(self.points))
+            self.points.extend(segments[row+1:row+1+stride])
+            row += 1 + stride
+        self.compile_coefficients(restricted)
+        return
+
+    def __len__(self):
+        return len(self.kinds)
+
+    # Build a curve from already compiled arrays, such as memoryviews into a motion pack, without copying them
+    # Coefficients are worked out from the points if they are not given
+    @classmethod
+    def from_arrays(cls, target: str, id: str, times, kinds, offsets, points, coefficients=None) -> 'Curve':
+        curve = cls.__new__(cls)
+        curve.target = target
+        curve.id = id
+        curve.times = times
+        curve.kinds = kinds
+        curve.offsets = offsets
+        curve.points = points
+        if coefficients is None:
+            curve.compile_coefficients()
+        else:
+            curve.coefficients = coefficients
+        return curve
+
+    # Work out the polynomial coefficients of every segment from its control points
+    # Each segment has eight: ax, bx, cx, dx for x(t) = ax*t^3 + bx*t^2 + cx*t + dx, then the same for y(t)
+    def compile_coefficients(self, restricted: bool=False) -> None:
+        coefficients = array('d')
+        points = self.points
+        for index in range(len(self.kinds)):
+            kind = self.kinds[index]
+            row = self.offsets[index]
+            x0 = points[row-2]
+            y0 = points[row-1]
+            if kind == 0:
+                coefficients.extend((0.0, 0.0, points[row]-x0, x0, 0.0, 0.0, points[row+1]-y0, y0))
+            elif kind == 1:
+                x1 = points[row]
+                y1 = points[row+1]
+                x2 = points[row+2]
+                y2 = points[row+3]
+                x3 = points[row+4]
+                y3 = points[row+5]
+                ax = x3 - x0 + 3*(x1-x2)
+                bx = 3*(x0 - 2*x1 + x2)
+                cx = 3*(x1-x0)
+                # Handles a third of the way along make x linear in t, so no solving is needed
+                if restricted or abs(ax) + abs(bx) <= 1e-9 * abs(x3-x0):
+                    ax = 0.0
+                    bx = 0.0
+                    cx = x3 - x0
+                coefficients.extend((ax, bx, cx, x0, y3 - y0 + 3*(y1-y2), 3*(y0 - 2*y1 + y2), 3*(y1-y0), y0))
+            else:
+                # Stepped and inverse-stepped segments cannot be evaluated
+                coefficients.extend((0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0))
+        self.coefficients: array = coefficients
+        return
+
+    # Returns the index of the segment that is active at this second
+    def locate(self, st: float) -> int:
+        index = bisect_right(self.times, st) - 1
+        if index < 0:
+            index = 0
+        return index
+
+    # Solve for the value of the curve at this second within the given segment
+    def evaluate(self, st: float, index: int) -> float:
+        if self.kinds[index] > 1:
+            raise ValueError('Stepped and inverse-stepped segments are unsupported')
+        c = self.coefficients
+        row = index * 8
+        ax = c[row]
+        bx = c[row+1]
+        if ax == 0.0 and bx == 0.0:
+            # Linear segments and restricted beziers, same arithmetic as linear()
+            t = (st-c[row+3]) / c[row+2]
+        else:
+            t = bezier_time(st, ax, bx, c[row+2], c[row+3])
+        return ((c[row+4]*t + c[row+5])*t + c[row+6])*t + c[row+7]
+
+    # Find the value of the curve at this second
+    def value(self, st: float) -> float:
+        return self.evaluate(st, self.locate(st))
+
+# Class for the segments of every curve of a motion stored as NumPy arrays, so all curves can be evaluated at once.
+# Requires NumPy.
+class CurveTable():
+    def __init__(self, curves: list[Curve]):
+        if numpy is None:
+            raise ImportError('NumPy is required for curve tables')
+        elif not isinstance(curves, list):
+            raise TypeError('Curves must be a list')
+        self.ids: list[tuple[str, str]] = [(curve.target, curve.id) for curve in curves]
+        # Every curve's segment start times are shifted by a multiple of span so one sorted array holds all of them
+        span = 1.0 + max([abs(curve.points[i]) for curve in curves for i in range(0, len(curve.points), 2)], default=0.0)
+        self.shift = numpy.arange(len(curves), dtype=numpy.float64) * span
+        self.first = numpy.zeros(len(curves), dtype=numpy.intp)
+        self.last = numpy.zeros(len(curves), dtype=numpy.intp)
+        keys = list()
+        kinds = list()
+        coefficients = list()
+        for number, curve in enumerate(curves):
+            self.first[number] = len(kinds)
+            for index in range(len(curve)):
+                keys.append(curve.times[index] + self.shift[number])
+                kinds.append(curve.kinds[index])
+            coefficients.append(numpy.asarray(curve.coefficients, dtype=numpy.float64))
+            self.last[number] = len(kinds) - 1
+        self.keys = numpy.array(keys, dtype=numpy.float64)
+        self.kinds = numpy.array(kinds, dtype=numpy.int8)
+        # Same layout as Curve.coefficients, one row of eight per segment
+        self.coefficients = numpy.concatenate(coefficients).reshape(len(kinds), 8) if len(kinds) > 0 else numpy.zeros((0, 8))
+        return
+
+    # Size of the arrays in bytes
+    def nbytes(self) -> int:
+        return self.shift.nbytes + self.first.nbytes + self.last.nbytes + self.keys.nbytes + self.kinds.nbytes + self.coefficients.nbytes
+
+    # Find the value of every curve at this second. The result is aligned with ids.
+    def evaluate(self, st: float):
+        index = numpy.searchsorted(self.keys, st + self.shift, side='right') - 1
+        return self.solve(numpy.clip(index, self.first, self.last), st)
+
+    # Find the value of every curve at each of many seconds in one pass. The result has a row for each second, and each
+    # row is the same as evaluate gives for that second
+    def evaluate_many(self, sts: list[float]):
+        sts = numpy.asarray(sts, dtype=numpy.float64).reshape(-1, 1)
+        index = numpy.searchsorted(self.keys, sts + self.shift, side='right') - 1
+        return self.solve(numpy.clip(index, self.first, self.last), sts)
+
+    # Find the values of the segments at the given indices, at the seconds given for each of them
+    def solve(self, index, st):
+        kinds = self.kinds[index]
+        if (kinds > 1).any():
+            raise ValueError('Stepped and inverse-stepped segments are unsupported')
+        (ax, bx, cx, dx, ay, by, cy, dy) = numpy.moveaxis(self.coefficients[index], -1, 0)
+        t = (st-dx) / (ax+bx+cx)
+        # Solve for t where x is not linear in t, the same way as bezier_time()
+        curved = (ax != 0.0) | (bx != 0.0)
+        if curved.any():
+            (a, b, c, d) = (ax[curved], bx[curved], cx[curved], dx[curved])
+            x = numpy.broadcast_to(st, curved.shape)[curved]
+            guess = numpy.clip(t[curved], 0.0, 1.0)
+            low = numpy.zeros_like(guess)
+            high = numpy.ones_like(guess)
+            for i in range(bezier_time_iterations):
+                error = ((a*guess + b)*guess + c)*guess + d - x
+                if (numpy.abs(error) < 1e-12).all():
+                    break
+                high = numpy.where(error > 0.0, guess, high)
+                low = numpy.where(error < 0.0, guess, low)
+                slope = (3*a*guess + 2*b)*guess + c
+                with numpy.errstate(divide='ignore', invalid='ignore'):
+                    step = guess - error/slope
+                inside = (slope > 0.0) & (step > low) & (step < high)
+                guess = numpy.where(numpy.abs(error) < 1e-12, guess, numpy.where(inside, step, (low+high) / 2))
+            t[curved] = guess
+        return ((ay*t + by)*t + cy)*t + dy
+
 # Class for motions
 class Motion():
-    def __init__(self, name: str, duration: float, curves: list):
+    __slots__ = ('name', 'duration', 'curves', 'compiled', 'constants', 'simplified', 'table', 'source', 'bake', '__weakref__')
+
+    # Curves that are already compiled can be given instead of raw curves, in which case curves is left empty
+    def __init__(self, name: str, duration: float, curves: list, compiled: list[Curve] | None=None, restricted: bool=False):
         if not isinstance(name, str):
             raise TypeError('Name must be a string')
         elif not (isinstance(duration, float) or isinstance(duration, int)):
             raise TypeError('Duration must be an float')
         elif not isinstance(curves, list):
             raise TypeError('Curves must be a list')
+        elif not (compiled is None or isinstance(compiled, list)):
+            raise TypeError('Compiled curves must be a list')
         else:
             self.name: str = name
             self.duration: float = float(duration)
             self.curves: list = curves
+            if compiled is None:
+                compiled = [Curve(curve['Target'], curve['Id'], curve['Segments'], restricted) for curve in curves]
+            self.compiled: list[Curve] = compiled
+            self.constants: list[tuple[str, str, float]] = list()
+            self.simplified: dict | None = None
+            self.table: CurveTable | None = None
+            # Identifies the file and settings the motion was read with, see share_key
+            self.source: tuple | None = None
+            self.bake: bool = False
             return
     
     def __str__(self):
         return f'Name: {self.name}\nDuration: {self.duration}\nCurves: {self.curves}'
 
+    # Approximate number of bytes this motion keeps loaded. Counts the compiled curves, the curve table if it has been
+    # built, and the curves read from the file, where each number is a float object in a list
+    def nbytes(self) -> int:
+        size = 0
+        for curve in self.compiled:
+            for values in (curve.times, curve.kinds, curve.offsets, curve.points, curve.coefficients):
+                size += len(values) * values.itemsize
+        if self.table is not None:
+            size += self.table.nbytes()
+        for curve in self.curves:
+            size += 32 * len(curve['Segments'])
+        return size
+
+    # Fold curves that never move further than the tolerance from their first value into constants, and merge runs of
+    # linear segments whose inner keyframes are within the tolerance of a straight line. Bezier and stepped segments
+    # are kept as they are. Returns the number of curves and keyframes removed, which is also kept in simplified
+    def simplify(self, tolerance: float=0.0) -> dict:
+        if not (isinstance(tolerance, float) or isinstance(tolerance, int)):
+            raise TypeError('Tolerance must be a float')
+        elif tolerance < 0:
+            raise ValueError('Tolerance must not be negative')
+        # Leave room for rounding so exactly collinear keyframes are merged without a tolerance
+        tolerance = max(float(tolerance), 1e-12)
+        compiled = list()
+        removed_curves = 0
+        removed_keyframes = 0
+        for curve in self.compiled:
+            points = curve.points
+            first = points[1]
+            if all(abs(points[i] - first) <= tolerance for i in range(1, len(points), 2)):
+                self.constants.append((curve.target, curve.id, first))
+                removed_curves += 1
+                removed_keyframes += len(curve)
+                continue
+            times = array('d')
+            kinds = array('b')
+            offsets = array('L')
+            merged = array('d', points[0:2])
+            coefficients = array('d')
+            index = 0
+            while index < len(curve):
+                kind = curve.kinds[index]
+                if kind == 0:
+                    # Extend the run of linear segments for as long as the keyframes skipped stay near the line
+                    (x0, y0) = (merged[-2], merged[-1])
+                    end = index
+                    while end + 1 < len(curve) and curve.kinds[end+1] == 0:
+                        row = curve.offsets[end+1]
+                        (x1, y1) = (points[row], points[row+1])
+                        # Keyframes at the same time as the start of the run make a jump, which no line can fit
+                        if x1 == x0:
+                            break
+                        fits = True
+                        for inner in range(index, end + 1):
+                            row = curve.offsets[inner]
+                            if abs(y0 + (y1-y0) * (points[row]-x0) / (x1-x0) - points[row+1]) > tolerance:
+                                fits = False
+                                break
+                        if not fits:
+                            break
+                        end += 1
+                    removed_keyframes += end - index
+                    row = curve.offsets[end]
+                    times.append(x0)
+                    kinds.append(0)
+                    offsets.append(len(merged))
+                    merged.extend(points[row:row+2])
+                    coefficients.extend((0.0, 0.0, points[row]-x0, x0, 0.0, 0.0, points[row+1]-y0, y0))
+                    index = end + 1
+                else:
+                    row = curve.offsets[index]
+                    stride = 6 if kind == 1 else 2
+                    times.append(merged[-2])
+                    kinds.append(kind)
+                    offsets.append(len(merged))
+                    merged.extend(points[row:row+stride])
+                    coefficients.extend(curve.coefficients[index*8:index*8+8])
+                    index += 1
+            compiled.append(Curve.from_arrays(curve.target, curve.id, times, kinds, offsets, merged, coefficients))
+        self.compiled = compiled
+        self.table = None
+        # The curves no longer match the file they were read from
+        self.source = None
+        report = {'Curves': removed_curves, 'Keyframes': removed_keyframes}
+        self.simplified = report
+        return report
+
+    # Returns a key that is the same for every copy of this motion with the same curves and the same way of being
+    # evaluated. Copies read from the same file share it unless the file changed between reads, they were simplified
+    # differently, or only one of them is baked. Motions not read from a file are only the same as themselves
+    def share_key(self):
+        if self.source is None:
+            return self
+        return (self.source, self.bake)
+
+    # Returns True if this motion is evaluated with its curve table rather than curve by curve
+    def uses_table(self) -> bool:
+        return numpy_backend and len(self.compiled) >= numpy_min_curves
+
+    # Find the value of every curve of this motion at this second, in the same order as the compiled curves
+    # Large motions are evaluated in one pass with NumPy when the backend is enabled
+    def values(self, st: float, cursor: 'Cursor | None'=None) -> list[float]:
+        if st > self.duration:
+            # Failsafe for if st is greater than entire length of motion
+            st = self.duration
+        if self.bake and bake_cache is not None:
+            baked = bake_cache.get(self)
+            if baked is not None:
+                return baked.values(st, bake_cache.interpolate)
+        if self.uses_table():
+            if self.table is None:
+                self.table = CurveTable(self.compiled)
+            return self.table.evaluate(st).tolist()
+        elif cursor is None:
+            return [curve.value(st) for curve in self.compiled]
+        elif cursor.motion is not self:
+            raise ValueError(f'Cursor does not belong to motion "{self.name}"')
+        else:
+            cursor.advance(st)
+            return [curve.evaluate(st, cursor.seek(number, st)) for number, curve in enumerate(self.compiled)]
+
+    # Find the value of every curve of this motion at each of many seconds. Each list is the same as values gives for
+    # that second. Motions evaluated with their curve table find every second in one pass
+    def values_many(self, sts: list[float]) -> list[list[float]]:
+        sts = [min(st, self.duration) for st in sts]
+        if self.bake and bake_cache is not None:
+            baked = bake_cache.get(self)
+            if baked is not None:
+                return [baked.values(st, bake_cache.interpolate) for st in sts]
+        if self.uses_table():
+            if self.table is None:
+                self.table = CurveTable(self.compiled)
+            return self.table.evaluate_many(sts).tolist()
+        return [[curve.value(st) for curve in self.compiled] for st in sts]
+
+# Class for playback cursors. A cursor remembers the active segment of every curve of one playing motion, so while time
+# only moves forward each curve steps ahead from where it was instead of searching again.
+# A model playing the motion also keeps the slots of its curves on the cursor, so they are only looked up once.
+class Cursor():
+    __slots__ = ('motion', 'indices', 'st', 'slots', 'lookups')
+
+    def __init__(self, motion: Motion):
+        if not isinstance(motion, Motion):
+            raise TypeError('Motion must be a Motion')
+        self.motion: Motion = motion
+        self.indices: array = array('L', [0]) * len(motion.compiled)
+        self.st: float = 0.0
+        self.slots: tuple[tuple, tuple] | None = None
+        # Number of times the active segment of a curve was stepped to or searched for
+        self.lookups: int = 0
+        return
+
+    # Forget every remembered segment
+    def reset(self) -> None:
+        for i in range(len(self.indices)):
+            self.indices[i] = 0
+        self.st = 0.0
+        return
+
+    # Returns the index of the active segment of the given curve at this second
+    def seek(self, number: int, st: float) -> int:
+        curve = self.motion.compiled[number]
+        times = curve.times
+        index = self.indices[number]
+        last = len(times) - 1
+        if index < last and times[index+1] <= st:
+            index += 1
+            self.lookups += 1
+            # Jumped more than one segment ahead, search instead of stepping
+            if index < last and times[index+1] <= st:
+                index = curve.locate(st)
+                self.lookups += 1
+            self.indices[number] = index
+        return index
+
+    # Move the cursor to this second. Time going backwards (a loop wrapping or a skip) falls back to a full search.
+    def advance(self, st: float) -> None:
+        if st < self.st:
+            for number, curve in enumerate(self.motion.compiled):
+                self.indices[number] = curve.locate(st)
+            self.lookups += len(self.indices)
+        self.st = st
+        return
+
 # Class for expressions
 class Expression():
+    __slots__ = ('name', 'parameters', '__weakref__')
+
     def __init__(self, name: str, parameters: list):
         if not isinstance(name, str):
             raise TypeError('Name must be a string')
@@ -42,13 +475,43 @@ class Expression():
     def __str__(self):
         return f'Name: {self.name}\nParameters: {self.parameters}'
     
-# Exclusive animations use a FIFO queue. Exclusive animations can only play one at a time.
+# Exclusive animations use a FIFO queue for each priority level. Exclusive animations can only play one at a time.
+# Higher priority motions are played before lower ones, motions of the same priority are played in the order they were pushed
 class Exclusive:
+    __slots__ = ('levels', 'priorities', 'count')
+
     def __init__(self):
-        self.exclusive_queue: queue.Queue = queue.Queue()
+        self.levels: dict[int, deque] = dict()
+        self.priorities: list[int] = list()
+        self.count: int = 0
+        return
+
+    def __len__(self) -> int:
+        return self.count
+
+    # Queued crossfades are saved with a named easing, see saved_crossfade
+    def __getstate__(self):
+        levels = {priority: deque([(motion_name, wait_seconds, skip_seconds, loop, saved_crossfade(crossfade))
+                                   for (motion_name, wait_seconds, skip_seconds, loop, crossfade) in level])
+                  for priority, level in self.levels.items()}
+        return (levels, self.priorities, self.count)
+
+    def __setstate__(self, state):
+        # Older saves hold the slots in a dict
+        if len(state) == 2:
+            state = (state[1]['levels'], state[1]['priorities'], state[1]['count'])
+        (self.levels, self.priorities, self.count) = state
         return
 
-    def push(self, motion_name: str, wait_seconds: float, skip_seconds: float, loop: bool) -> None:
+    def __contains__(self, motion_name: str) -> bool:
+        for priority in self.priorities:
+            for entry in self.levels[priority]:
+                if entry[0] == motion_name:
+                    return True
+        return False
+
+    # A crossfade is given as its duration and easing, and blends from the pose when the motion starts into the motion
+    def push(self, motion_name: str, wait_seconds: float, skip_seconds: float, loop: bool, priority: int=0, crossfade: tuple | None=None) -> None:
         if not isinstance(motion_name, str):
             raise TypeError('Motion name must be a string')
         elif not (isinstance(wait_seconds, float) or isinstance(wait_seconds, int)):
@@ -57,21 +520,92 @@ class Exclusive:
             raise TypeError('Skip seconds must be a float')
         elif not isinstance(loop, bool):
             raise TypeError('Loop must be a bool')
+        elif not isinstance(priority, int):
+            raise TypeError('Priority must be an int')
+        elif not (crossfade is None or isinstance(crossfade, tuple)):
+            raise TypeError('Crossfade must be a tuple of duration and easing')
         else:
-            self.exclusive_queue.put((motion_name, float(wait_seconds), float(skip_seconds), loop))
+            if priority not in self.levels:
+                self.levels[priority] = deque()
+                # Kept highest first
+                self.priorities.append(priority)
+                self.priorities.sort(reverse=True)
+            self.levels[priority].append((motion_name, float(wait_seconds), float(skip_seconds), loop, crossfade))
+            self.count += 1
             return
     
-    def pop(self) -> tuple[str, float, float, bool] | None:
-        if self.exclusive_queue.empty():
+    def pop(self) -> tuple[str, float, float, bool, tuple | None] | None:
+        for priority in self.priorities:
+            level = self.levels[priority]
+            if len(level) > 0:
+                self.count -= 1
+                return level.popleft()
+        return None
+
+    # Returns the entry that will be played after as many others as the index, without removing it
+    def peek(self, index: int=0) -> tuple[str, float, float, bool, tuple | None] | None:
+        if index < 0 or index >= self.count:
             return None
-        else:
-            (motion_name, wait_seconds, skip_seconds, loop) = self.exclusive_queue.get()
-            return (motion_name, wait_seconds, skip_seconds, loop)
+        for priority in self.priorities:
+            level = self.levels[priority]
+            if index < len(level):
+                return level[index]
+            index -= len(level)
+        return None
+
+    # Returns the priority of the entry that will be played next, or None if the queue is empty
+    def priority(self) -> int | None:
+        for priority in self.priorities:
+            if len(self.levels[priority]) > 0:
+                return priority
+        return None
+
+    # Returns every queued entry in the order they will be played, along with its priority
+    def entries(self) -> list[tuple[str, float, float, bool, tuple | None, int]]:
+        values = list()
+        for priority in self.priorities:
+            for (motion_name, wait_seconds, skip_seconds, loop, crossfade) in self.levels[priority]:
+                values.append((motion_name, wait_seconds, skip_seconds, loop, crossfade, priority))
+        return values
+
+    # Remove every queued entry of a motion. Returns the number of entries removed
+    def cancel(self, motion_name: str) -> int:
+        if not isinstance(motion_name, str):
+            raise TypeError('Motion name must be a string')
+        removed = 0
+        for priority in self.priorities:
+            level = self.levels[priority]
+            kept = [entry for entry in level if entry[0] != motion_name]
+            if len(kept) != len(level):
+                removed += len(level) - len(kept)
+                self.levels[priority] = deque(kept)
+        self.count -= removed
+        return removed
+
+    def empty(self) -> bool:
+        return self.count <= 0
+
+    def clear(self) -> None:
+        self.levels.clear()
+        self.priorities.clear()
+        self.count = 0
+        return
 
 # Inclusive animations use a dict. All inclusive animations in the dict can play simultaneously.
+# The times each motion next starts and ends are kept in a min-heap, so each frame only touches motions that are playing
+# or due to change. Entries left in the heap by a motion that was removed or rescheduled are skipped when they come up.
+# Orders and generations are both taken from one counter, so a motion that is removed and added again never has the
+# generation of an entry it left in the heap
 class Inclusive:
+    __slots__ = ('inclusive_dict', 'orders', 'generations', 'timers', 'playing', 'sequence')
+
     def __init__(self):
         self.inclusive_dict: dict = dict()
+        self.orders: dict = dict()
+        self.generations: dict = dict()
+        self.timers: list = list()
+        self.playing: list = list()
+        self.sequence: int = 0
         return
 
     def add(self, motion_name: str, min_seconds: float, max_seconds: float) -> None:
@@ -82,7 +616,13 @@ class Inclusive:
         elif not (isinstance(max_seconds, float) or isinstance(max_seconds, int)):
             raise TypeError('Maximum seconds must be a float')
         else:
+            if motion_name not in self.orders:
+                self.orders[motion_name] = self.sequence
+                self.sequence += 1
             self.inclusive_dict[motion_name] = (float(min_seconds), float(max_seconds), 0.0, 0.0)
+            self.stop(motion_name)
+            # Due as soon as time moves past 0, when its first wait is chosen
+            self.schedule(motion_name, None, 0.0)
             return
 
     def remove(self, motion_name: str) -> None:
@@ -92,13 +632,70 @@ class Inclusive:
             return
         else:
             self.inclusive_dict.pop(motion_name)
+            self.orders.pop(motion_name)
+            self.generations.pop(motion_name)
+            self.stop(motion_name)
             return
 
+    def clear(self) -> None:
+        self.inclusive_dict.clear()
+        self.orders.clear()
+        self.generations.clear()
+        self.timers.clear()
+        self.playing.clear()
+        return
+
+    # Push the start and end of a motion to the heap. Kind 0 is a start and kind 1 is an end
+    def schedule(self, motion_name: str, start_time: float | None, end_time: float) -> None:
+        generation = self.sequence
+        self.sequence += 1
+        self.generations[motion_name] = generation
+        order = self.orders[motion_name]
+        if start_time is not None:
+            heapq.heappush(self.timers, (start_time, order, 0, motion_name, generation))
+        heapq.heappush(self.timers, (end_time, order, 1, motion_name, generation))
+        return
+
+    def stop(self, motion_name: str) -> None:
+        if motion_name in self.playing:
+            self.playing.remove(motion_name)
+        return
+
+    # Pop every start and end before st. Motions that started are marked as playing. Returns the names of motions that
+    # ended, in the order they were added, so they can be given a new wait
+    def advance(self, st: float) -> list[str]:
+        finished = list()
+        timers = self.timers
+        while len(timers) > 0 and timers[0][0] < st:
+            (when, order, kind, motion_name, generation) = heapq.heappop(timers)
+            if self.generations.get(motion_name) != generation:
+                continue
+            elif kind == 0:
+                self.playing.append(motion_name)
+                self.playing.sort(key=self.orders.__getitem__)
+            else:
+                self.stop(motion_name)
+                finished.append(motion_name)
+        finished.sort(key=self.orders.__getitem__)
+        return finished
+
+    # Returns the earliest start or end still scheduled, or None if there is none
+    def next_time(self) -> float | None:
+        timers = self.timers
+        while len(timers) > 0 and self.generations.get(timers[0][3]) != timers[0][4]:
+            heapq.heappop(timers)
+        if len(timers) <= 0:
+            return None
+        return timers[0][0]
+
 # Active expressions use a dict. All active expressions are shown simultaneously.
+# Requests to add or remove an expression are queued and handled in order on the next frame
 class ActiveExpressions:
+    __slots__ = ('expressions_dict', 'pending')
+
     def __init__(self):
         self.expressions_dict: dict = dict()
-        self.next: tuple[str, float, bool] | None = None
+        self.pending: deque = deque()
         return
     
     def add(self, expression_name: str, fade_in_time: float) -> None:
@@ -108,7 +705,7 @@ class ActiveExpressions:
             raise TypeError('Fade in time must be a float')
         else:
             #self.expressions_dict[expression_name] = float(fade_in_time)
-            self.next = (expression_name, float(fade_in_time), False)
+            self.pending.append((expression_name, float(fade_in_time), False))
             return
 
     def remove(self, expression_name: str, fade_out_time) -> None:
@@ -116,13 +713,825 @@ class ActiveExpressions:
             raise TypeError('Expression name must be a string')
         elif not (isinstance(fade_out_time, float) or isinstance(fade_out_time, int)):
             raise TypeError('Fade out time must be a float')
-        elif expression_name not in self.expressions_dict:
+        elif not self.will_be_active(expression_name):
             return
         else:
             #self.expressions_dict.pop(expression_name)
-            self.next = (expression_name, float(fade_out_time), True)
+            self.pending.append((expression_name, float(fade_out_time), True))
             return
 
+    # Whether the expression is active once every pending request has been handled
+    def will_be_active(self, expression_name: str) -> bool:
+        active = expression_name in self.expressions_dict
+        for (name, fade_time, is_fade_out) in self.pending:
+            if name == expression_name:
+                active = not is_fade_out
+        return active
+
+# Running expression fades. Each fade is a fixed-size record kept in parallel arrays, so any number of fades can be
+# blended in one loop without building a motion for them. Records are keyed by the slot of the parameter. Starting a fade
+# on a parameter that is already fading replaces the old record, starting from the value currently shown
+class FadeTracks():
+    __slots__ = ('slots', 'index', 'origins', 'targets', 'starts', 'durations', 'kinds')
+    easings: dict = {'linear': 0, 'bezier': 1}
+
+    def __init__(self):
+        self.slots: array = array('L')
+        self.index: dict = dict()
+        self.origins: array = array('d')
+        self.targets: array = array('d')
+        self.starts: array = array('d')
+        self.durations: array = array('d')
+        self.kinds: array = array('b')
+        return
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def start(self, slot: int, origin: float, target: float, st: float, duration: float, easing: str='bezier') -> None:
+        if easing not in self.easings:
+            raise ValueError(f'"{easing}" is not a valid type. Choose "linear" or "bezier"')
+        kind = self.easings[easing]
+        if slot in self.index:
+            i = self.index[slot]
+            self.origins[i] = origin
+            self.targets[i] = target
+            self.starts[i] = st
+            self.durations[i] = duration
+            self.kinds[i] = kind
+        else:
+            self.index[slot] = len(self.slots)
+            self.slots.append(slot)
+            self.origins.append(origin)
+            self.targets.append(target)
+            self.starts.append(st)
+            self.durations.append(duration)
+            self.kinds.append(kind)
+        return
+
+    # Value of the fade on this slot at st, or the default if it is not fading
+    def current(self, slot: int, st: float, default: float) -> float:
+        if slot not in self.index:
+            return default
+        return self.sample(self.index[slot], st)
+
+    def sample(self, i: int, st: float) -> float:
+        u = (st - self.starts[i]) / self.durations[i]
+        if u <= 0.0:
+            return self.origins[i]
+        elif u >= 1.0:
+            return self.targets[i]
+        # The bezier fade has its handles at a third of the duration and flat at both ends, which is a smoothstep
+        if self.kinds[i] == 1:
+            u = u * u * (3.0 - 2.0 * u)
+        return self.origins[i] + (self.targets[i] - self.origins[i]) * u
+
+    # Write every running fade to a blend buffer and drop the ones that have finished. Returns the number of fades still
+    # running
+    def blend(self, blends: 'BlendBuffer', st: float) -> int:
+        i = 0
+        while i < len(self.slots):
+            blends.write(self.slots[i], self.sample(i, st))
+            if st >= self.starts[i] + self.durations[i]:
+                self.remove(i)
+            else:
+                i += 1
+        return len(self.slots)
+
+    # Stop the fade on this slot, if there is one
+    def cancel(self, slot: int) -> None:
+        if slot in self.index:
+            self.remove(self.index[slot])
+        return
+
+    # Remove a record by moving the last record into its place
+    def remove(self, i: int) -> None:
+        last = len(self.slots) - 1
+        self.index.pop(self.slots[i])
+        if i != last:
+            self.slots[i] = self.slots[last]
+            self.origins[i] = self.origins[last]
+            self.targets[i] = self.targets[last]
+            self.starts[i] = self.starts[last]
+            self.durations[i] = self.durations[last]
+            self.kinds[i] = self.kinds[last]
+            self.index[self.slots[i]] = i
+        self.slots.pop()
+        self.origins.pop()
+        self.targets.pop()
+        self.starts.pop()
+        self.durations.pop()
+        self.kinds.pop()
+        return
+
+    def clear(self) -> None:
+        self.index.clear()
+        del self.slots[:]
+        del self.origins[:]
+        del self.targets[:]
+        del self.starts[:]
+        del self.durations[:]
+        del self.kinds[:]
+        return
+
+# Slot tables give every parameter and part a model uses an integer slot, so playback state can be kept in flat lists
+# indexed by slot instead of in dicts keyed by strings. Lists are used rather than array('d') since reading an array from
+# Python makes a new float every time. Each slot also has the target code and the id of what it sets.
+# Motions are shared between models, so the slots of a motion's curves are kept here rather than on the motion
+class Slots():
+    __slots__ = ('keys', 'ids', 'codes', 'index', 'motions')
+
+    def __init__(self):
+        self.keys: list[tuple[str, str]] = list()
+        self.ids: list[str] = list()
+        self.codes: list[int] = list()
+        self.index: dict = dict()
+        self.motions: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        return
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    # The slots of motions are not saved, they are looked up again when the motions are next played
+    def __getstate__(self):
+        return (self.keys, self.codes, self.index)
+
+    def __setstate__(self, state):
+        (self.keys, self.codes, self.index) = state
+        self.ids = [id for (target, id) in self.keys]
+        self.motions = weakref.WeakKeyDictionary()
+        return
+
+    # Returns the slot of a parameter or part, giving it one first if it has none
+    def intern(self, target: str, id: str) -> int:
+        global target_codes
+        key = (target, id)
+        slot = self.index.get(key)
+        if slot is None:
+            slot = len(self.keys)
+            self.index[key] = slot
+            self.keys.append(key)
+            self.ids.append(id)
+            self.codes.append(target_codes.get(target, -1))
+        return slot
+
+    # Returns the slots of a motion's compiled curves and of its constant curves
+    def motion(self, motion: Motion) -> tuple[tuple, tuple]:
+        slots = self.motions.get(motion)
+        if slots is None:
+            slots = (tuple(self.intern(curve.target, curve.id) for curve in motion.compiled),
+                     tuple(self.intern(target, id) for (target, id, value) in motion.constants))
+            self.motions[motion] = slots
+        return slots
+
+# Values kept per slot, such as the persistent pose. Only slots that have been set hold a value. Those slots are also
+# kept in the order they were first set, so they can be gone over without looking at the rest
+class SlotValues():
+    __slots__ = ('values', 'present', 'order')
+
+    def __init__(self):
+        self.values: list[float] = list()
+        self.present: list[int] = list()
+        self.order: list[int] = list()
+        return
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def __contains__(self, slot: int) -> bool:
+        return slot < len(self.present) and self.present[slot] != 0
+
+    def get(self, slot: int, default: float | None=None) -> float | None:
+        if slot < len(self.present) and self.present[slot] != 0:
+            return self.values[slot]
+        return default
+
+    # Make room for this many slots
+    def reserve(self, count: int) -> None:
+        if count > len(self.present):
+            self.values.extend([0.0] * (count - len(self.values)))
+            self.present.extend([0] * (count - len(self.present)))
+        return
+
+    def set(self, slot: int, value: float) -> None:
+        self.reserve(slot + 1)
+        if self.present[slot] == 0:
+            self.present[slot] = 1
+            self.order.append(slot)
+        self.values[slot] = value
+        return
+
+    # Set many slots at once. There must already be room for every slot
+    def set_all(self, slots: tuple, values: list[float]) -> None:
+        stored = self.values
+        present = self.present
+        for slot, value in zip(slots, values):
+            if present[slot] == 0:
+                present[slot] = 1
+                self.order.append(slot)
+            stored[slot] = value
+        return
+
+    # Blend values for some slots in from the values held here by weight. Slots with no value here are not blended
+    def blend_toward(self, slots: tuple, values: list[float], weight: float) -> list[float]:
+        stored = self.values
+        present = self.present
+        count = len(present)
+        return [stored[slot] + (value - stored[slot]) * weight if slot < count and present[slot] != 0 else value
+                for slot, value in zip(slots, values)]
+
+    def copy(self) -> 'SlotValues':
+        values = SlotValues()
+        values.values = list(self.values)
+        values.present = list(self.present)
+        values.order = list(self.order)
+        return values
+
+    def clear(self) -> None:
+        for slot in self.order:
+            self.present[slot] = 0
+        del self.order[:]
+        return
+
+class BakedMotion():
+    def __init__(self, motion: Motion, rate: float):
+        if not isinstance(motion, Motion):
+            raise TypeError('Motion must be a Motion')
+        elif not (isinstance(rate, float) or isinstance(rate, int)):
+            raise TypeError('Rate must be a float')
+        elif rate <= 0:
+            raise ValueError('Rate must be greater than 0')
+        self.rate: float = float(rate)
+        self.duration: float = motion.duration
+        self.width: int = len(motion.compiled)
+        self.count: int = BakedMotion.sample_count(motion.duration, self.rate)
+        self.table: array = array('f')
+        # Sample the curves directly so a motion marked for baking does not read from the cache while being baked
+        cursor = Cursor(motion)
+        for i in range(self.count):
+            st = min(i / self.rate, motion.duration)
+            cursor.advance(st)
+            for number, curve in enumerate(motion.compiled):
+                self.table.append(curve.evaluate(st, cursor.seek(number, st)))
+        return
+
+    # Build a baked motion from a table that was already sampled, such as one baked in another process
+    @classmethod
+    def from_table(cls, motion: Motion, rate: float, table: array) -> 'BakedMotion':
+        baked = cls.__new__(cls)
+        baked.rate = float(rate)
+        baked.duration = motion.duration
+        baked.width = len(motion.compiled)
+        baked.count = BakedMotion.sample_count(motion.duration, baked.rate)
+        if len(table) != baked.count * baked.width:
+            raise ValueError(f'Table of motion "{motion.name}" must have {baked.count * baked.width} samples')
+        baked.table = table
+        return baked
+
+    # Number of samples of each curve. One sample every 1/rate seconds, plus a last sample at the very end of the motion
+    @staticmethod
+    def sample_count(duration: float, rate: float) -> int:
+        count = int(duration * rate) + 1
+        if (count-1) / rate < duration:
+            count += 1
+        return count
+
+    # Size of the table in bytes
+    def nbytes(self) -> int:
+        return len(self.table) * self.table.itemsize
+
+    # Find the value of every curve at this second from the samples either side of it, or the nearest sample
+    def values(self, st: float, interpolate: bool=True) -> list[float]:
+        width = self.width
+        position = st * self.rate
+        i = int(position)
+        if i >= self.count - 1:
+            return self.table[(self.count-1)*width:].tolist()
+        elif i < 0:
+            return self.table[:width].tolist()
+        elif not interpolate:
+            if position - i >= 0.5:
+                i += 1
+            return self.table[i*width:(i+1)*width].tolist()
+        start = i / self.rate
+        end = min((i+1) / self.rate, self.duration)
+        weight = (st - start) / (end - start)
+        before = self.table[i*width:(i+1)*width]
+        after = self.table[(i+1)*width:(i+2)*width]
+        return [a + (b-a)*weight for a, b in zip(before, after)]
+
+# Bake caches hold baked motions up to a budget in bytes. The least recently used tables are dropped first.
+class BakeCache():
+    def __init__(self, budget: int, samples_per_frame: float=1.0, interpolate: bool=True):
+        if not isinstance(budget, int):
+            raise TypeError('Budget must be an int')
+        elif not (isinstance(samples_per_frame, float) or isinstance(samples_per_frame, int)):
+            raise TypeError('Samples per frame must be a float')
+        elif not isinstance(interpolate, bool):
+            raise TypeError('Interpolate must be a bool')
+        self.budget: int = budget
+        self.samples_per_frame: float = float(samples_per_frame)
+        self.interpolate: bool = interpolate
+        self.tables: OrderedDict = OrderedDict()
+        self.size: int = 0
+        return
+
+    def __str__(self):
+        return f'Baked motions: {len(self.tables)}\nSize: {self.size}\nBudget: {self.budget}'
+
+    # Returns the baked table for a motion, baking it first if needed. Returns None if the table can never fit.
+    def get(self, motion: Motion) -> BakedMotion | None:
+        global FPS
+        rate = FPS * self.samples_per_frame
+        baked = self.tables.get(motion)
+        if baked is not None and baked.rate == rate:
+            self.tables.move_to_end(motion)
+            return baked
+        elif baked is not None:
+            # FPS has changed since the motion was baked
+            self.discard(motion)
+        # Check the size before sampling anything
+        count = int(motion.duration * rate) + 2
+        if count * len(motion.compiled) * array('f').itemsize > self.budget:
+            return None
+        baked = BakedMotion(motion, rate)
+        self.add(motion, baked)
+        return baked
+
+    # Add a baked table for a motion, replacing any it had, and drop the least recently used tables until the cache
+    # fits its budget again
+    def add(self, motion: Motion, baked: BakedMotion) -> None:
+        self.discard(motion)
+        self.tables[motion] = baked
+        self.size += baked.nbytes()
+        while self.size > self.budget:
+            (_, evicted) = self.tables.popitem(last=False)
+            self.size -= evicted.nbytes()
+        return
+
+    # Drop the baked table of a motion
+    def discard(self, motion: Motion) -> None:
+        baked = self.tables.pop(motion, None)
+        if baked is not None:
+            self.size -= baked.nbytes()
+        return
+
+    # Drop every baked table
+    def clear(self) -> None:
+        self.tables.clear()
+        self.size = 0
+        return
+
+# Motion budgets keep the motions loaded by every model under a budget in bytes. Motions are unloaded from their model
+# least recently used first, and read from disk again the next time they are needed. Motions that are playing or queued,
+# or that have no file to be read again from, are never unloaded. A motion's size is measured when its model loads it.
+# Motions shared between models through the motion library are counted for each model that holds them
+class MotionBudget():
+    def __init__(self, budget: int):
+        if not isinstance(budget, int):
+            raise TypeError('Budget must be an int')
+        elif budget < 0:
+            raise ValueError('Budget must not be negative')
+        self.budget: int = budget
+        # Keyed by the id of the model and the motion name, holding a weak reference to the model and the motion's size
+        self.entries: OrderedDict = OrderedDict()
+        self.size: int = 0
+        self.unloaded: int = 0
+        return
+
+    def __str__(self):
+        return f'Loaded motions: {len(self.entries)}\nSize: {self.size}\nBudget: {self.budget}\nUnloaded: {self.unloaded}'
+
+    # Record that a model has used a motion, measuring it if the model has just loaded it, then unload motions until the
+    # budget is met again. The motion just used is not unloaded
+    def use(self, model: 'Model', motion_name: str, motion: Motion) -> None:
+        key = (id(model), motion_name)
+        entry = self.entries.get(key)
+        if entry is not None and entry[0]() is model:
+            self.entries.move_to_end(key)
+        else:
+            # An entry with a dead model was left by a model that has been deleted, and a new model was given its id
+            self.forget(key)
+            size = motion.nbytes()
+            self.entries[key] = (weakref.ref(model), size)
+            self.size += size
+        # Motions that were in use last time may have stopped since
+        if self.size > self.budget:
+            self.trim(key)
+        return
+
+    # Stop counting a motion
+    def forget(self, key: tuple) -> None:
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[1]
+        return
+
+    # Unload the least recently used motions that are not in use until the budget is met, or no more can be unloaded.
+    # Returns the number of bytes unloaded
+    def trim(self, keep: tuple | None=None) -> int:
+        freed = 0
+        for key in list(self.entries):
+            if self.size <= self.budget:
+                break
+            elif key == keep:
+                continue
+            model = self.entries[key][0]()
+            (model_id, motion_name) = key
+            if model is None or motion_name not in model.motions:
+                # The model was deleted or the motion was unloaded some other way
+                self.forget(key)
+            elif not model.motion_in_use(motion_name):
+                size = self.entries[key][1]
+                model.unload_motion(motion_name)
+                self.unloaded += 1
+                freed += size
+        return freed
+
+    # Returns the bytes of motions each model has loaded, by model name. Models with the same name are added together
+    def report(self) -> dict[str, int]:
+        values: dict = dict()
+        for (key, (reference, size)) in list(self.entries.items()):
+            model = reference()
+            if model is None:
+                self.forget(key)
+            else:
+                values[model.name] = values.get(model.name, 0) + size
+        return values
+
+    # Stop counting every motion. Nothing is unloaded
+    def clear(self) -> None:
+        self.entries.clear()
+        self.size = 0
+        return
+
+# Class for motion packs. A motion pack is one file holding the compiled curves of every motion of a model as contiguous
+# arrays plus an index. The file is memory-mapped and motions read from it use memoryviews into the map, so loading a
+# motion copies nothing and allocates nothing per keyframe.
+class MotionPack():
+    def __init__(self, file_path: str | Path):
+        if not (isinstance(file_path, str) or isinstance(file_path, Path)):
+            raise TypeError('File path must be a string or a path')
+        self.path: Path = Path(file_path)
+        self.open()
+        return
+
+    def __str__(self):
+        return f'Path: {self.path}\nMotions: {list(self.index)}'
+
+    # Map the file and read its index
+    def open(self) -> None:
+        global pack_magic
+        with open(self.path, 'rb') as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.map)
+        if bytes(self.view[0:8]) != pack_magic:
+            raise ValueError(f'{self.path} is not a motion pack')
+        index_length = int.from_bytes(self.view[8:16], 'little')
+        header = json.loads(bytes(self.view[16:16+index_length]))
+        if header['ByteOrder'] != sys.byteorder:
+            raise ValueError(f'{self.path} was written on a machine with a different byte order')
+        self.data_start: int = (16 + index_length + 7) // 8 * 8
+        self.index: dict = {entry['Name']: entry for entry in header['Motions']}
+        self.key: tuple = file_key(self.path)
+        return
+
+    # Packs are saved by path and mapped again when loaded
+    def __getstate__(self):
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.path = state['path']
+        self.open()
+        return
+
+    # Returns the names of every motion in the pack
+    def names(self) -> list[str]:
+        return list(self.index)
+
+    # Returns a view of one array stored in the pack
+    def array(self, offset: int, length: int, typecode: str) -> memoryview:
+        start = self.data_start + offset
+        return self.view[start:start + length * array(typecode).itemsize].cast(typecode)
+
+    # Build a motion whose curves point into the pack
+    def load(self, motion_name: str) -> Motion:
+        if motion_name not in self.index:
+            raise KeyError(f'No motion with the name "{motion_name}" in motion pack "{self.path}"')
+        entry = self.index[motion_name]
+        compiled = list()
+        for curve in entry['Curves']:
+            count = curve['Count']
+            # Packs written before coefficients were stored have them worked out again
+            coefficients = self.array(curve['Coefficients'], count * 8, 'd') if 'Coefficients' in curve else None
+            compiled.append(Curve.from_arrays(curve['Target'], curve['Id'],
+                                              self.array(curve['Times'], count, 'd'),
+                                              self.array(curve['Kinds'], count, 'b'),
+                                              self.array(curve['Offsets'], count, 'Q'),
+                                              self.array(curve['Points'], curve['PointCount'], 'd'),
+                                              coefficients))
+        motion = Motion(motion_name, entry['Duration'], list(), compiled)
+        motion.constants = [(target, id, value) for (target, id, value) in entry.get('Constants', list())]
+        motion.simplified = entry.get('Simplified')
+        motion.source = self.key + (motion_name,)
+        return motion
+
+# Motion libraries share parsed motions, expressions and motion packs between every model loaded from the same files, so
+# loading a model folder again only costs building the model. Entries are keyed by the resolved path, along with the size
+# and modification time of the file and the simplification tolerance, so a changed file is read again. Entries are only
+# held weakly and go away once no model uses them.
+# Shared motions are the same objects in every model, so baking a motion bakes it for every model that uses it
+class MotionLibrary():
+    def __init__(self):
+        self.motions: weakref.WeakValueDictionary = weakref.WeakValueDictionary()
+        self.expressions: weakref.WeakValueDictionary = weakref.WeakValueDictionary()
+        self.packs: weakref.WeakValueDictionary = weakref.WeakValueDictionary()
+        # Prefetch threads read through the library too
+        self.lock: threading.Lock = threading.Lock()
+        return
+
+    def __len__(self) -> int:
+        return len(self.motions) + len(self.expressions)
+
+    def __str__(self):
+        return f'Motions: {len(self.motions)}\nExpressions: {len(self.expressions)}\nPacks: {len(self.packs)}'
+
+    def key(self, file_path: str | Path) -> tuple:
+        global simplify_tolerance
+        return file_key(file_path) + (simplify_tolerance,)
+
+    # Returns the shared motion read from this file, reading it first if no model is using it
+    def motion(self, file_path: Path) -> Motion:
+        key = self.key(file_path)
+        motion = self.motions.get(key)
+        if motion is None:
+            motion = load_motion(file_path)
+            with self.lock:
+                motion = self.motions.setdefault(key, motion)
+        return motion
+
+    # Returns the shared motion read from a motion pack
+    def pack_motion(self, pack: 'MotionPack', motion_name: str) -> Motion:
+        key = self.key(pack.path) + (motion_name,)
+        motion = self.motions.get(key)
+        if motion is None:
+            motion = pack.load(motion_name)
+            with self.lock:
+                motion = self.motions.setdefault(key, motion)
+        return motion
+
+    # Returns the shared expression read from this file
+    def expression(self, file_path: Path) -> Expression:
+        key = self.key(file_path)
+        expression = self.expressions.get(key)
+        if expression is None:
+            expression = load_expression(file_path)
+            with self.lock:
+                expression = self.expressions.setdefault(key, expression)
+        return expression
+
+    # Returns the shared motion pack at this path, so the file is only mapped once
+    def pack(self, file_path: str | Path) -> 'MotionPack':
+        key = self.key(file_path)
+        pack = self.packs.get(key)
+        if pack is None:
+            pack = MotionPack(file_path)
+            with self.lock:
+                pack = self.packs.setdefault(key, pack)
+        return pack
+
+    def clear(self) -> None:
+        with self.lock:
+            self.motions.clear()
+            self.expressions.clear()
+            self.packs.clear()
+        return
+
+# Blend buffers stand in for a Ren'Py Live2D model during an update. A later write to the same parameter or part opacity
+# in the same frame replaces the earlier one, and flush sends each of them to the real model once, in the order they were
+# first written. Only "Overwrite" blends are used by this module, so those are the only ones a buffer accepts.
+# Values are written by slot. Blends by id are given a slot in the buffer's slot table first
+class BlendBuffer:
+    __slots__ = ('renpy_model', 'slots', 'values', 'written', 'order', 'sent_model', 'sent_values')
+
+    def __init__(self, slots: Slots | None=None, renpy_model=None):
+        self.renpy_model = renpy_model
+        self.slots: Slots = Slots() if slots is None else slots
+        self.values: list[float] = list()
+        self.written: list[int] = list()
+        self.order: list[int] = list()
+        self.sent_model = None
+        # Slots that have not been sent hold NaN, which is not equal to any value
+        self.sent_values: list[float] = list()
+        return
+
+    # Parameter defaults are read from the real model
+    @property
+    def common(self):
+        return self.renpy_model.common
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    # Make room for every slot in the slot table
+    def reserve(self) -> None:
+        count = len(self.slots.keys)
+        if count > len(self.written):
+            self.values.extend([0.0] * (count - len(self.values)))
+            self.written.extend([0] * (count - len(self.written)))
+        return
+
+    def write(self, slot: int, value: float) -> None:
+        if slot >= len(self.written):
+            self.reserve()
+        if self.written[slot] == 0:
+            self.written[slot] = 1
+            self.order.append(slot)
+        self.values[slot] = value
+        return
+
+    # Write many slots at once. Slots of targets that cannot be blended, like the WIP model opacity, are left out
+    def write_all(self, slots: tuple, values: list[float]) -> None:
+        self.reserve()
+        codes = self.slots.codes
+        stored = self.values
+        written = self.written
+        append = self.order.append
+        for slot, value in zip(slots, values):
+            if codes[slot] != 0:
+                if written[slot] == 0:
+                    written[slot] = 1
+                    append(slot)
+                stored[slot] = value
+        return
+
+    # Write every slot that has a value in some slot values, such as the persistent pose
+    def write_from(self, slot_values: SlotValues) -> None:
+        self.reserve()
+        codes = self.slots.codes
+        stored = self.values
+        written = self.written
+        append = self.order.append
+        values = slot_values.values
+        for slot in slot_values.order:
+            if codes[slot] != 0:
+                if written[slot] == 0:
+                    written[slot] = 1
+                    append(slot)
+                stored[slot] = values[slot]
+        return
+
+    def blend_parameter(self, id: str, blend: str, value: float) -> None:
+        if blend != 'Overwrite':
+            raise ValueError('Blend buffers only accept "Overwrite" blends')
+        self.write(self.slots.intern('Parameter', id), value)
+        return
+
+    def blend_opacity(self, id: str, blend: str, value: float) -> None:
+        if blend != 'Overwrite':
+            raise ValueError('Blend buffers only accept "Overwrite" blends')
+        self.write(self.slots.intern('PartOpacity', id), value)
+        return
+
+    # Send every buffered value to a model, whether it changed or not, and empty the buffer. Returns how many blend calls
+    # were made
+    def send(self, renpy_model) -> int:
+        ids = self.slots.ids
+        codes = self.slots.codes
+        values = self.values
+        written = self.written
+        count = 0
+        for slot in self.order:
+            written[slot] = 0
+            code = codes[slot]
+            # Part parameter value
+            if code == 1:
+                renpy_model.blend_parameter(ids[slot], "Overwrite", values[slot])
+                count += 1
+            # Part opacity
+            elif code == 2:
+                renpy_model.blend_opacity(ids[slot], "Overwrite", values[slot])
+                count += 1
+        del self.order[:]
+        return count
+
+    # Send every buffered value to the real model and empty the buffer. Returns how many blend calls were made.
+    # If skip_unchanged_blends is set, values equal to the ones sent to the same model last time are not sent again
+    def flush(self) -> int:
+        global skip_unchanged_blends
+        renpy_model = self.renpy_model
+        if not skip_unchanged_blends:
+            return self.send(renpy_model)
+        sent_values = self.sent_values
+        if self.sent_model is not renpy_model:
+            # Values sent to a different model say nothing about this one
+            self.sent_model = renpy_model
+            del sent_values[:]
+        if len(sent_values) < len(self.written):
+            sent_values.extend([math.nan] * (len(self.written) - len(sent_values)))
+        ids = self.slots.ids
+        codes = self.slots.codes
+        values = self.values
+        written = self.written
+        count = 0
+        for slot in self.order:
+            written[slot] = 0
+            value = values[slot]
+            if sent_values[slot] == value:
+                continue
+            code = codes[slot]
+            # Part parameter value
+            if code == 1:
+                renpy_model.blend_parameter(ids[slot], "Overwrite", value)
+            # Part opacity
+            elif code == 2:
+                renpy_model.blend_opacity(ids[slot], "Overwrite", value)
+            else:
+                continue
+            sent_values[slot] = value
+            count += 1
+        del self.order[:]
+        return count
+
+    # Empty the buffer without sending anything
+    def clear(self) -> None:
+        written = self.written
+        for slot in self.order:
+            written[slot] = 0
+        del self.order[:]
+        return
+
+# Class for profiling a model. Keeps how long each update stage took and how much work was done over a rolling window of
+# frames, along with running totals.
+class Profile:
+    stages: tuple = ('force_persistence', 'animate_exclusive', 'animate_inclusive', 'animate_expression')
+
+    def __init__(self, window: int=300):
+        if not isinstance(window, int):
+            raise TypeError('Window must be an int')
+        elif window <= 0:
+            raise ValueError('Window must be greater than 0')
+        self.window: int = window
+        self.frames: int = 0
+        self.times: dict = {stage: deque(maxlen=window) for stage in Profile.stages}
+        self.counts: dict = {counter: deque(maxlen=window) for counter in ('curves', 'segments', 'blends')}
+        self.totals: dict = {counter: 0 for counter in ('curves', 'segments', 'blends')}
+        # Work done in the frame currently being animated
+        self.curves: int = 0
+        self.segments: int = 0
+        self.synthetic: int = 0
+        self.synthetic_peak: int = 0
+        self.synthetic_created: int = 0
+        return
+
+    def __str__(self):
+        return json.dumps(self.snapshot(), indent=4)
+
+    # Record the stage times and counters of a frame that has just been animated
+    def end_frame(self, times: tuple, synthetic: int, synthetic_created: int) -> None:
+        self.frames += 1
+        for stage, seconds in zip(Profile.stages, times):
+            self.times[stage].append(seconds)
+        self.counts['curves'].append(self.curves)
+        self.counts['segments'].append(self.segments)
+        self.totals['curves'] += self.curves
+        self.totals['segments'] += self.segments
+        self.curves = 0
+        self.segments = 0
+        self.synthetic = synthetic
+        self.synthetic_created = synthetic_created
+        if synthetic > self.synthetic_peak:
+            self.synthetic_peak = synthetic
+        return
+
+    # Record how many blend calls a flush made
+    def add_blends(self, count: int) -> None:
+        self.counts['blends'].append(count)
+        self.totals['blends'] += count
+        return
+
+    # Returns the current statistics as a dict. Times are in milliseconds and averaged over the window.
+    def snapshot(self) -> dict:
+        stats: dict = dict()
+        stats['Frames'] = self.frames
+        stats['Window'] = self.window
+        for stage, samples in self.times.items():
+            if len(samples) > 0:
+                stats[stage] = {'Mean ms': 1000.0 * sum(samples) / len(samples), 'Max ms': 1000.0 * max(samples)}
+            else:
+                stats[stage] = {'Mean ms': 0.0, 'Max ms': 0.0}
+        for counter, samples in self.counts.items():
+            mean = sum(samples) / len(samples) if len(samples) > 0 else 0.0
+            stats[counter] = {'Per frame': mean, 'Total': self.totals[counter]}
+        stats['Synthetic motions'] = {'Current': self.synthetic, 'Peak': self.synthetic_peak, 'Created': self.synthetic_created}
+        return stats
+
+    # Write the current statistics to a JSON file
+    def dump(self, file_path: str | Path) -> None:
+        with open(file_path, 'w') as file:
+            json.dump(self.snapshot(), file, indent=4)
+        return
+
 #######################################################################################################################
 
 class Model:
@@ -132,6 +1541,12 @@ class Model:
         self.name: str = name
         self.motions: dict = dict()
         self.expressions: dict = dict()
+        self.motion_files: dict = dict()
+        self.expression_files: dict = dict()
+        self.synthetic_motions: dict = dict()
+        self.unloaded_baked: set = set()
+        self.motion_prefetches: dict = dict()
+        self.expression_prefetches: dict = dict()
         self.exclusive: Exclusive = Exclusive()
         self.inclusive: Inclusive = Inclusive()
         self.active_expressions: ActiveExpressions = ActiveExpressions()
@@ -140,24 +1555,72 @@ class Model:
         self.action_end_time: float = 0.0
         self.action_skip_time: float = 0.0
         self.action_loop: bool = False
-        self.persistent: dict = dict()
-        self.fading: str | None = None
-        self.fading_start_time: float = 0.0
-        self.fading_end_time: float = 0.0
-        self.persistent_exp: dict = dict()
+        self.action_priority: int = 0
+        self.action_crossfade: tuple | None = None
+        self.action_constants: bool = False
+        self.action_cursor: Cursor | None = None
+        self.inclusive_cursors: dict = dict()
+        self.random: random.Random | None = None
+        self.slots: Slots = Slots()
+        self.persistent: SlotValues = SlotValues()
+        self.fades: FadeTracks = FadeTracks()
+        self.persistent_exp: SlotValues = SlotValues()
         self.st: float = 0.0
         self.sequential_name = 0
+        self.shared_values: dict | None = None
+        self.blends: BlendBuffer = BlendBuffer(self.slots)
+        self.profile: Profile | None = None
+        self.library: MotionLibrary | None = None
         return
     
     def __str__(self):
         out: str = str()
         out += f'Model name: {self.name}\n'
-        for motion in self.motions:
+        for motion in self.motion_names():
             out += f'Motion name: {motion}\n'
-        for expression in self.expressions:
+        for expression in self.expression_names():
             out += f'Expression name: {expression}\n'
         return out
     
+    # Only playback state is pickled, for Ren'Py saves and rollback. Motions and expressions are saved by the name of the
+    # file they were read from and read again, or taken from the motion library, when they are next needed. Transition
+    # motions still in use are saved as their curves and compiled again. Prefetches, cursors, the blend buffer and the
+    # profile are not saved
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for key in ('motions', 'expressions', 'synthetic_motions', 'motion_prefetches', 'expression_prefetches',
+                    'action', 'action_cursor', 'inclusive_cursors', 'shared_values', 'blends', 'profile', 'library'):
+            state.pop(key)
+        state['action_name'] = None if self.action is None else self.action.name
+        if self.action_crossfade is not None:
+            (origins, crossfade_start_time, crossfade_end_time, easing) = self.action_crossfade
+            state['action_crossfade'] = (origins, crossfade_start_time, crossfade_end_time, saved_easing(easing))
+        state['synthetic_curves'] = [(motion.name, motion.duration, motion.curves) for motion in self.synthetic_motions.values()]
+        # Motions that were not read from a file have nothing to be read again from
+        state['unfiled_motions'] = {motion_name: motion for (motion_name, motion) in self.motions.items() if motion_name not in self.motion_files}
+        return state
+
+    def __setstate__(self, state):
+        global motion_library
+        state = dict(state)
+        action_name = state.pop('action_name')
+        synthetic_curves = state.pop('synthetic_curves')
+        self.motions = state.pop('unfiled_motions')
+        self.unloaded_baked = set()
+        self.__dict__.update(state)
+        self.expressions = dict()
+        self.synthetic_motions = {motion_name: Motion(motion_name, duration, curves) for (motion_name, duration, curves) in synthetic_curves}
+        self.motion_prefetches = dict()
+        self.expression_prefetches = dict()
+        self.inclusive_cursors = dict()
+        self.shared_values = None
+        self.blends = BlendBuffer(self.slots)
+        self.profile = None
+        self.library = motion_library
+        self.action = None if action_name is None else self.get_motion(action_name)
+        self.action_cursor = None if self.action is None else self.make_cursor(self.action)
+        return
+
 #######################################################################################################################
 #                                                                                                                     #
 #                                                   USER FUNCTIONS                                                    #
@@ -172,7 +1635,7 @@ class Model:
         expressions: list[str] = list()
         if self.action is not None:
             exclusives.append(self.action.name)
-        for (motion_name, wait_seconds, loop) in list(self.exclusive.exclusive_queue.queue):
+        for (motion_name, wait_seconds, skip_seconds, loop, crossfade, priority) in self.exclusive.entries():
             exclusives.append(motion_name)
         for (k, v) in self.inclusive.inclusive_dict.items():
             inclusives.append(k)
@@ -183,33 +1646,207 @@ class Model:
         values['Expressions'] = expressions
         return values
 
+    # Returns how many curves and keyframes were removed from each loaded motion that was simplified
+    def simplify_report(self) -> dict[str, dict]:
+        values: dict = dict()
+        for (motion_name, motion) in self.motions.items():
+            if motion.simplified is not None:
+                values[motion_name] = motion.simplified
+        return values
+
+    # Returns the names of every motion of this model, loaded or not
+    def motion_names(self) -> list[str]:
+        return list(self.motions) + [motion_name for motion_name in self.motion_files if motion_name not in self.motions]
+
+    # Returns the names of every expression of this model, loaded or not
+    def expression_names(self) -> list[str]:
+        return list(self.expressions) + [expression_name for expression_name in self.expression_files if expression_name not in self.expressions]
+
+    # Returns True if the model has a motion with this name, loaded or not
+    def has_motion(self, motion_name: str) -> bool:
+        return motion_name in self.motions or motion_name in self.motion_files or motion_name in self.synthetic_motions
+
+    # Returns True if the model has an expression with this name, loaded or not
+    def has_expression(self, expression_name: str) -> bool:
+        return expression_name in self.expressions or expression_name in self.expression_files
+
+    # Returns a motion, reading it from disk first if it has not been loaded yet
+    def get_motion(self, motion_name: str) -> Motion:
+        motion = self.motions.get(motion_name)
+        if motion is not None:
+            return motion
+        motion = self.synthetic_motions.get(motion_name)
+        if motion is not None:
+            return motion
+        future = self.motion_prefetches.pop(motion_name, None)
+        if future is not None:
+            # Only blocks if the prefetch has not finished yet
+            motion = future.result()
+        elif motion_name in self.motion_files:
+            motion = self.read_motion(motion_name)
+        else:
+            raise KeyError(f'No motion with the name "{motion_name}" associated with model "{self.name}"')
+        if motion_name in self.unloaded_baked:
+            # The motion was baked before the motion budget unloaded it
+            self.unloaded_baked.discard(motion_name)
+            motion.bake = True
+        self.motions[motion_name] = motion
+        self.touch_motion(motion_name)
+        return motion
+
+    # Record that a motion was used, so the motion budget unloads motions used longer ago first
+    def touch_motion(self, motion_name: str) -> None:
+        global motion_budget
+        motion = self.motions.get(motion_name)
+        if motion_budget is not None and motion is not None:
+            motion_budget.use(self, motion_name, motion)
+        return
+
+    # Returns True if a motion is playing or queued, or has no file to be read again from if it were unloaded
+    def motion_in_use(self, motion_name: str) -> bool:
+        if self.action is not None and self.action is self.motions.get(motion_name):
+            return True
+        elif motion_name in self.exclusive or motion_name in self.inclusive.inclusive_dict:
+            return True
+        return motion_name not in self.motion_files
+
+    # Unload a motion so it is read from disk again the next time it is needed. Returns True if the motion was unloaded,
+    # or False if it was not loaded or is in use
+    def unload_motion(self, motion_name: str) -> bool:
+        global bake_cache, motion_budget
+        if motion_name not in self.motions or self.motion_in_use(motion_name):
+            return False
+        motion = self.motions.pop(motion_name)
+        self.inclusive_cursors.pop(motion_name, None)
+        if motion.bake:
+            self.unloaded_baked.add(motion_name)
+            if bake_cache is not None:
+                bake_cache.discard(motion)
+        if motion_budget is not None:
+            motion_budget.forget((id(self), motion_name))
+        return True
+
+    # Returns the approximate number of bytes each motion this model has loaded keeps in memory
+    def resident_report(self) -> dict[str, int]:
+        return {motion_name: motion.nbytes() for (motion_name, motion) in self.motions.items()}
+
+    # Read a motion from the file or motion pack it was indexed from, or from the motion library if this model uses one
+    def read_motion(self, motion_name: str) -> Motion:
+        source = self.motion_files[motion_name]
+        if isinstance(source, MotionPack):
+            if self.library is not None:
+                return self.library.pack_motion(source, motion_name)
+            return source.load(motion_name)
+        elif self.library is not None:
+            return self.library.motion(source)
+        else:
+            return load_motion(source)
+
+    # Read an expression from the file it was indexed from, or from the motion library if this model uses one
+    def read_expression(self, expression_name: str) -> Expression:
+        source = self.expression_files[expression_name]
+        if self.library is not None:
+            return self.library.expression(source)
+        else:
+            return load_expression(source)
+
+    # Returns an expression, reading it from disk first if it has not been loaded yet
+    def get_expression(self, expression_name: str) -> Expression:
+        expression = self.expressions.get(expression_name)
+        if expression is not None:
+            return expression
+        future = self.expression_prefetches.pop(expression_name, None)
+        if future is not None:
+            expression = future.result()
+        elif expression_name in self.expression_files:
+            expression = self.read_expression(expression_name)
+        else:
+            raise KeyError(f'No expression with the name "{expression_name}" associated with model "{self.name}"')
+        self.expressions[expression_name] = expression
+        return expression
+
+    # Start reading a motion in the background if it has not been loaded yet and a prefetch pool is set
+    def prefetch_motion(self, motion_name: str) -> None:
+        global prefetch_pool
+        if prefetch_pool is None or motion_name in self.motions or motion_name in self.motion_prefetches:
+            return
+        elif motion_name in self.motion_files:
+            self.motion_prefetches[motion_name] = prefetch_pool.submit(self.read_motion, motion_name)
+        return
+
+    # Start reading an expression in the background if it has not been loaded yet and a prefetch pool is set
+    def prefetch_expression(self, expression_name: str) -> None:
+        global prefetch_pool
+        if prefetch_pool is None or expression_name in self.expressions or expression_name in self.expression_prefetches:
+            return
+        elif expression_name in self.expression_files:
+            self.expression_prefetches[expression_name] = prefetch_pool.submit(self.read_expression, expression_name)
+        return
+
     # Push a motion to the exclusive queue
-    def exclusive_push(self, motion_name: str, wait_seconds: float=0, skip_seconds: float=0, loop: bool=True) -> None:
-        self.exclusive.push(motion_name, wait_seconds, skip_seconds, loop)
+    # A motion with a higher priority than the current action is played right away, ending the current action
+    def exclusive_push(self, motion_name: str, wait_seconds: float=0, skip_seconds: float=0, loop: bool=True, priority: int=0, crossfade: tuple | None=None) -> None:
+        self.exclusive.push(motion_name, wait_seconds, skip_seconds, loop, priority, crossfade)
+        self.touch_motion(motion_name)
+        self.prefetch_motion(motion_name)
+        if self.action is not None and priority > self.action_priority:
+            self.exclusive_skip()
         return
     
     # Pop a motion from the exclusive queue
-    def exclusive_pop(self) -> tuple[str, float, float, bool] | None:
+    def exclusive_pop(self) -> tuple[str, float, float, bool, tuple | None] | None:
         return self.exclusive.pop()
+
+    # Returns the queued entry that will be played after as many others as the index, without removing it
+    def exclusive_peek(self, index: int=0) -> tuple[str, float, float, bool, tuple | None] | None:
+        return self.exclusive.peek(index)
+
+    # Remove every queued entry of a motion. The current action is not affected. Returns the number of entries removed
+    def exclusive_cancel(self, motion_name: str) -> int:
+        removed = self.exclusive.cancel(motion_name)
+        self.release_synthetic(motion_name)
+        return removed
+
+    # Returns the name, start time and end time of the current action and every queued motion, in the order they
+    # will be played, assuming each queued motion plays once after the one before it
+    def exclusive_upcoming(self) -> list[tuple[str, float, float]]:
+        values: list = list()
+        end_time = self.st
+        if self.action is not None:
+            values.append((self.action.name, self.action_start_time, self.action_end_time))
+            end_time = max(end_time, self.action_end_time)
+        for (motion_name, wait_seconds, skip_seconds, loop, crossfade, priority) in self.exclusive.entries():
+            duration = self.get_motion(motion_name).duration
+            if skip_seconds > duration:
+                skip_seconds = duration
+            start_time = end_time + wait_seconds
+            end_time = start_time + duration - skip_seconds
+            values.append((motion_name, start_time, end_time))
+        return values
     
     # Returns True if exclusive queue is empty
     def exclusive_empty(self) -> bool:
-        return self.exclusive.exclusive_queue.empty()
+        return self.exclusive.empty()
 
     # Skip playing the current motion
     def exclusive_skip(self) -> None:
+        global motion_budget
+        previous = self.action
         if self.exclusive_empty():
             self.action = None
             self.action_start_time = 0.0
             self.action_end_time = 0.0
             self.action_skip_time = 0.0
             self.action_loop = False
-            return
+            self.action_priority = 0
+            self.action_crossfade = None
+            self.action_cursor = None
         else:
+            self.action_priority = self.exclusive.priority()     # type: ignore
             popped = self.exclusive_pop()
             assert popped is not None
-            (motion_name, wait_seconds, skip_seconds, loop) = popped
-            self.action = self.motions[motion_name]
+            (motion_name, wait_seconds, skip_seconds, loop, crossfade) = popped
+            self.action = self.get_motion(motion_name)
             # Failsafe
             if skip_seconds > self.action.duration:     # type: ignore
                 skip_seconds = self.action.duration     # type: ignore
@@ -217,8 +1854,21 @@ class Model:
             self.action_end_time = self.action_start_time + self.action.duration - skip_seconds     # type: ignore
             self.action_skip_time = skip_seconds
             self.action_loop = loop
-            return
-        
+            self.action_cursor = self.make_cursor(self.action)
+            self.action_constants = True
+            # Remember the pose the motion crossfades from. With nothing shown yet there is nothing to blend from
+            if crossfade is None or len(self.persistent) <= 0:
+                self.action_crossfade = None
+            else:
+                (crossfade_time, easing) = crossfade
+                self.action_crossfade = (self.persistent.copy(), self.action_start_time, self.action_start_time + crossfade_time, easing)
+        if previous is not None:
+            self.release_synthetic(previous.name)
+            # The motion that stopped may now be unloaded if motions are over the budget
+            if motion_budget is not None:
+                motion_budget.trim()
+        return
+
     # Skip all motions in the queue
     def exclusive_skipall(self) -> None:
         while(not self.exclusive_empty()):
@@ -228,20 +1878,68 @@ class Model:
     # Add a motion to the inclusive set
     def inclusive_add(self, motion_name: str, min_seconds: float=0, max_seconds: float=0) -> None:
         self.inclusive.add(motion_name, min_seconds, max_seconds)
+        self.touch_motion(motion_name)
+        self.prefetch_motion(motion_name)
         return
     
     # Remove a motion from the inclusive set
     def inclusive_remove(self, motion_name: str) -> None:
+        global motion_budget
         self.inclusive.remove(motion_name)
+        self.inclusive_cursors.pop(motion_name, None)
+        if motion_budget is not None:
+            motion_budget.trim()
         return
     
+    # Mark motions to be read from the bake cache, or every motion if none are named
+    def bake(self, *motion_names: str) -> None:
+        global bake_cache
+        if len(motion_names) <= 0:
+            motion_names = tuple(self.motion_names())
+        for motion_name in motion_names:
+            if not isinstance(motion_name, str):
+                raise TypeError('Motion name must be a string')
+            elif not self.has_motion(motion_name):
+                raise KeyError(f'No motion with the name "{motion_name}" associated with model "{self.name}"')
+            motion = self.get_motion(motion_name)
+            motion.bake = True
+            if bake_cache is not None:
+                bake_cache.get(motion)
+        return
+
+    # Stop reading motions from the bake cache, or every motion if none are named
+    def unbake(self, *motion_names: str) -> None:
+        global bake_cache
+        if len(motion_names) <= 0:
+            motion_names = tuple(self.motions) + tuple(self.unloaded_baked)
+        for motion_name in motion_names:
+            if not isinstance(motion_name, str):
+                raise TypeError('Motion name must be a string')
+            self.unloaded_baked.discard(motion_name)
+            if motion_name in self.motions:
+                self.motions[motion_name].bake = False
+                if bake_cache is not None:
+                    bake_cache.discard(self.motions[motion_name])
+        return
+
     # Remove all motions from the inclusive set
     def inclusive_removeall(self) -> None:
-        self.inclusive.inclusive_dict.clear()
+        self.inclusive.clear()
+        self.inclusive_cursors.clear()
+
+    # Give this model its own random number generator, so the waits between inclusive motions can be reproduced
+    # Without a seed, the waits are drawn from the shared generator of the random module again
+    def seed_random(self, seed: int | None=None) -> None:
+        if seed is None:
+            self.random = None
+        else:
+            self.random = random.Random(seed)
+        return
     
     # Activate an expression
     def expression_add(self, expression_name: str, fade_in_time: float=default_fade_time) -> None:
         self.active_expressions.add(expression_name, fade_in_time)
+        self.prefetch_expression(expression_name)
         return
     
     # Deactivate an expression
@@ -265,42 +1963,176 @@ class Model:
         self.action_end_time = 0.0
         self.action_skip_time = 0.0
         self.action_loop = False
-        self.fading = None
-        self.fading_start_time = 0.0
-        self.fading_end_time = 0.0
+        self.action_priority = 0
+        self.action_crossfade = None
+        self.action_cursor = None
+        self.active_expressions.pending.clear()
+        self.fades.clear()
+        self.synthetic_motions.clear()
 
     # Call every frame to animate
-    def update(self, renpy_model, st: float) -> float:
-        global FPS
+    # Returns the seconds until the model should be updated again, or None if nothing will change until it is redrawn
+    def update(self, renpy_model, st: float) -> float | None:
+        delay = self.animate(renpy_model, st)
+        count = self.blends.flush()
+        if self.profile is not None:
+            self.profile.add_blends(count)
+        return delay
+
+    # Run every animation stage for this frame into the blend buffer without sending anything to the model
+    def animate(self, renpy_model, st: float) -> float | None:
         self.st = st
-        self.force_persistence(renpy_model)
-        self.animate_exclusive(renpy_model)
-        self.animate_inclusive(renpy_model)
-        self.animate_expression(renpy_model)
-        return 1.0/FPS
+        blends = self.blends
+        blends.renpy_model = renpy_model
+        profile = self.profile
+        if profile is None:
+            self.force_persistence(blends)
+            self.animate_exclusive(blends)
+            self.animate_inclusive(blends)
+            self.animate_expression(blends)
+        else:
+            clock = time.perf_counter
+            time0 = clock()
+            self.force_persistence(blends)
+            time1 = clock()
+            self.animate_exclusive(blends)
+            time2 = clock()
+            self.animate_inclusive(blends)
+            time3 = clock()
+            self.animate_expression(blends)
+            time4 = clock()
+            profile.end_frame((time1-time0, time2-time1, time3-time2, time4-time3), len(self.synthetic_motions), self.sequential_name)
+        return self.redraw_delay()
+
+    # Start profiling this model, keeping statistics over the given number of frames
+    def enable_profiling(self, window: int=300) -> None:
+        self.profile = Profile(window)
+        return
+
+    # Stop profiling this model
+    def disable_profiling(self) -> None:
+        self.profile = None
+        return
+
+    # Returns how long Ren'Py should wait before updating the model again
+    # Without adaptive redraw this is always one frame. Otherwise the model sleeps until its next visible change.
+    def redraw_delay(self) -> float | None:
+        global FPS, adaptive_redraw, max_redraw_delay
+        frame = 1.0/FPS
+        if not adaptive_redraw:
+            return frame
+        delay = self.next_change()
+        if delay is None:
+            return max_redraw_delay
+        elif delay < frame:
+            delay = frame
+        if max_redraw_delay is not None and delay > max_redraw_delay:
+            delay = max_redraw_delay
+        return delay
+
+    # Returns the seconds from the current st until something visible next changes, 0 if it is changing right now, or
+    # None if nothing is scheduled to change
+    def next_change(self) -> float | None:
+        st = self.st
+        # A pending or running expression fade
+        if len(self.active_expressions.pending) > 0 or len(self.fades) > 0:
+            return 0.0
+        changes = list()
+        # The exclusive action is finished and something else will play next frame
+        if st >= self.action_end_time:
+            if not self.exclusive_empty() or self.action_loop:
+                return 0.0
+        # The exclusive action is playing
+        elif st >= self.action_start_time:
+            return 0.0
+        # The exclusive action is waiting to start
+        else:
+            changes.append(self.action_start_time - st)
+        # Inclusive motion is playing, or finished and about to be rescheduled
+        if len(self.inclusive.playing) > 0:
+            return 0.0
+        next_time = self.inclusive.next_time()
+        if next_time is not None:
+            if st > next_time:
+                return 0.0
+            # Inclusive motion is waiting to start
+            else:
+                changes.append(next_time - st)
+        if len(changes) <= 0:
+            return None
+        return min(changes)
     
 #######################################################################################################################
 
+    # Returns the motions and the seconds within them that animating at this second is expected to evaluate, which are
+    # the playing exclusive motion and the inclusive motions that keep playing. Motions that start this frame are left
+    # out, as are motions that are not loaded. A stage uses this to evaluate every model playing a motion at once
+    def planned_values(self, st: float) -> list[tuple[Motion, float]]:
+        values = list()
+        action = self.action
+        if action is not None and self.action_start_time <= st < self.action_end_time:
+            relative_st = st - self.action_start_time + self.action_skip_time
+            if relative_st <= action.duration:
+                values.append((action, relative_st))
+        for motion_name in self.inclusive.playing:
+            (min_seconds, max_seconds, start_time, end_time) = self.inclusive.inclusive_dict[motion_name]
+            motion = self.motions.get(motion_name)
+            if motion is None or end_time < st:
+                continue
+            relative_st = st - start_time
+            if relative_st > end_time - start_time:
+                relative_st = end_time - start_time
+            values.append((motion, relative_st))
+        return values
+
+    # Find the value of every curve of a motion at this second
+    # When the model is updated by a stage, values found this frame for another model playing a copy of the same motion
+    # at the same second are reused, see Motion.share_key
+    # The profile counts the segments that were stepped to or searched for. Curve tables and motions evaluated without a
+    # cursor search for every curve, and baked motions search for none
+    def evaluate(self, motion: Motion, relative_st: float, cursor: Cursor | None=None) -> list[float]:
+        profile = self.profile
+        if profile is not None:
+            profile.curves += len(motion.compiled)
+            lookups = 0 if cursor is None else cursor.lookups
+        if self.shared_values is None:
+            values = motion.values(relative_st, cursor)
+        else:
+            key = (motion.share_key(), relative_st)
+            values = self.shared_values.get(key)
+            if values is None:
+                values = motion.values(relative_st, cursor)
+                self.shared_values[key] = values
+            elif profile is not None:
+                # Reused from another model on the stage, no segments were evaluated
+                return values
+        if profile is None or (motion.bake and bake_cache is not None):
+            pass
+        elif cursor is None or motion.uses_table():
+            profile.segments += len(motion.compiled)
+        else:
+            profile.segments += cursor.lookups - lookups
+        return values
+
     # Make it so when exclusive motions end they do not revert parameters to default values
-    def force_persistence(self, renpy_model) -> None:
-        for (target, id), value in self.persistent.items():
-            if target == 'Model' and id == 'Opacity':
-                # WIP
-                pass
-            # Part parameter value
-            elif target == 'Parameter':
-                renpy_model.blend_parameter(id, "Overwrite", value)
-            # Part opacity
-            elif target == 'PartOpacity':
-                renpy_model.blend_opacity(id, "Overwrite", value)
+    def force_persistence(self, blends: BlendBuffer) -> None:
+        # Model opacity is WIP, parameters and part opacities are written
+        blends.write_from(self.persistent)
+
+    # Make a cursor for a motion this model is about to play, holding the slots of the motion's curves
+    def make_cursor(self, motion: Motion) -> Cursor:
+        cursor = Cursor(motion)
+        cursor.slots = self.slots.motion(motion)
+        self.persistent.reserve(len(self.slots))
+        return cursor
 
     # Call every frame to animate exclusive motions
-    def animate_exclusive(self, renpy_model) -> None:
+    def animate_exclusive(self, blends: BlendBuffer) -> None:
         # If currently idle, check queue
         if self.st >= self.action_end_time:
             # If queue empty and looping, add motion to the queue again
             if self.exclusive_empty() and self.action_loop == True:
-                self.exclusive_push(self.action.name, 0, 0, self.action_loop)   # type: ignore
+                self.exclusive_push(self.action.name, 0, 0, self.action_loop, self.action_priority)   # type: ignore
                 self.exclusive_skip()
             # If queue empty and not looping, do nothing
             elif self.exclusive_empty():
@@ -317,19 +2149,32 @@ class Model:
             if relative_st > self.action.duration:      # type: ignore
                 pass
             else:
-                params = self.second(self.action.name, relative_st)     # type: ignore
-                for param in params:
-                    # Model opacity
-                    if param['Target'] == 'Model' and param['Id'] == 'Opacity':
-                        # WIP
-                        pass
-                    # Part parameter value
-                    elif param['Target'] == 'Parameter':
-                        renpy_model.blend_parameter(param['Id'], "Overwrite", param['Value'])
-                    # Part opacity
-                    elif param['Target'] == 'PartOpacity':
-                        renpy_model.blend_opacity(param['Id'], "Overwrite", param['Value'])
-                    self.persistent[(param['Target'], param['Id'])] = param['Value']
+                motion = self.action
+                # While crossfading, each value is blended from the pose the motion started from
+                crossfade = self.action_crossfade
+                weight = 1.0
+                if crossfade is not None:
+                    (origins, crossfade_start_time, crossfade_end_time, easing) = crossfade
+                    if self.st >= crossfade_end_time:
+                        self.action_crossfade = None
+                        crossfade = None
+                    else:
+                        weight = ease(easing, (self.st - crossfade_start_time) / (crossfade_end_time - crossfade_start_time))
+                (slots, constant_slots) = self.action_cursor.slots     # type: ignore
+                # Constant curves are set once and then held by persistent, or set every frame while crossfading
+                if self.action_constants or crossfade is not None:
+                    self.action_constants = crossfade is not None
+                    values = [value for (target, id, value) in motion.constants]   # type: ignore
+                    if crossfade is not None:
+                        values = origins.blend_toward(constant_slots, values, weight)
+                    # Model opacity is WIP, parameters and part opacities are written
+                    blends.write_all(constant_slots, values)
+                    self.persistent.set_all(constant_slots, values)
+                values = self.evaluate(motion, relative_st, self.action_cursor)     # type: ignore
+                if crossfade is not None:
+                    values = origins.blend_toward(slots, values, weight)
+                blends.write_all(slots, values)
+                self.persistent.set_all(slots, values)
             return
         
         # Else motion is waiting to start
@@ -337,173 +2182,155 @@ class Model:
             return
         
     # Call every frame to animate inclusive animations
-    def animate_inclusive(self, renpy_model) -> None:
-        for motion_name, (min_seconds, max_seconds, start_time, end_time) in self.inclusive.inclusive_dict.items():
-            # If motion has finished playing, randomise a new wait time before looping
-            if motion_name not in self.motions:
+    def animate_inclusive(self, blends: BlendBuffer) -> None:
+        # If a motion has finished playing, randomise a new wait time before looping
+        for motion_name in self.inclusive.advance(self.st):
+            if not self.has_motion(motion_name):
                 raise KeyError(f'No motion with the name {motion_name} associated with model {self.name}')
-            elif self.st > end_time:
-                rand = min_seconds + (max_seconds - min_seconds) * random.random()
-                self.inclusive.inclusive_dict[motion_name] = (min_seconds, max_seconds, self.st + rand, self.st + self.motions[motion_name].duration + rand)
+            (min_seconds, max_seconds, start_time, end_time) = self.inclusive.inclusive_dict[motion_name]
+            rand = min_seconds + (max_seconds - min_seconds) * (random.random() if self.random is None else self.random.random())
+            start_time = self.st + rand
+            end_time = self.st + self.get_motion(motion_name).duration + rand
+            self.inclusive.inclusive_dict[motion_name] = (min_seconds, max_seconds, start_time, end_time)
+            self.inclusive.schedule(motion_name, start_time, end_time)
 
-        # Refresh values after updating
-        for motion_name, (min_seconds, max_seconds, start_time, end_time) in self.inclusive.inclusive_dict.items():
+        # Only motions that are currently playing are evaluated
+        for motion_name in self.inclusive.playing:
+            (min_seconds, max_seconds, start_time, end_time) = self.inclusive.inclusive_dict[motion_name]
             relative_st = self.st - start_time
             if relative_st > end_time - start_time:
                 # Failsafe for impossible end time value
                 relative_st = end_time - start_time
-            
-            # If motion is currently playing
-            if relative_st > 0:
-                params = self.second(motion_name, relative_st)
-                for param in params:
-                    # Model opacity
-                    if param['Target'] == 'Model' and param['Id'] == 'Opacity':
-                        # WIP
-                        pass
-                    # Part parameter value
-                    elif param['Target'] == 'Parameter':
-                        renpy_model.blend_parameter(param['Id'], "Overwrite", param['Value'])
-                    # Part opacity
-                    elif param['Target'] == 'PartOpacity':
-                        renpy_model.blend_opacity(param['Id'], "Overwrite", param['Value'])
-
-            # Else motion is waiting to start
-            else:
-                pass
+            motion = self.get_motion(motion_name)
+            cursor = self.inclusive_cursors.get(motion_name)
+            if cursor is None or cursor.motion is not motion:
+                cursor = self.make_cursor(motion)
+                self.inclusive_cursors[motion_name] = cursor
+            (slots, constant_slots) = cursor.slots     # type: ignore
+            # Model opacity is WIP, parameters and part opacities are written
+            blends.write_all(slots, self.evaluate(motion, relative_st, cursor))
+            # Inclusive motions do not write to persistent, so their constant curves are set every frame they play
+            if len(constant_slots) > 0:
+                blends.write_all(constant_slots, [value for (target, id, value) in motion.constants])
         return
     
     # Call every frame to set expressions
-    def animate_expression(self, renpy_model) -> None:
-        if self.active_expressions.next is not None:
-            (expression_name, fade_time, is_fade_out) = self.active_expressions.next
+    def animate_expression(self, blends: BlendBuffer) -> None:
+        pending = self.active_expressions.pending
+        while len(pending) > 0:
+            (expression_name, fade_time, is_fade_out) = pending.popleft()
             if is_fade_out is True:
-                self.active_expressions.expressions_dict.pop(expression_name)
+                self.active_expressions.expressions_dict.pop(expression_name, None)
             else:
                 self.active_expressions.expressions_dict[expression_name] = fade_time
-            self.active_expressions.next = None
             if fade_time == 0:
-                goal_list = [param for param in self.expressions[expression_name].parameters]
-                for entry in goal_list:
-                    id = entry['Id']
-                    if id not in self.persistent_exp:
-                        self.persistent_exp[id] = renpy_model.common.model.parameters[id].default
-                    value = entry['Value']
-                    blend = entry['Blend']
-                    if blend == 'Add':
-                        if is_fade_out is True:
-                            value = self.persistent_exp[id] - value
-                        else:
-                            value = self.persistent_exp[id] + value
-                    elif blend == 'Overwrite':
-                        if is_fade_out is True:
-                            value = renpy_model.common.model.parameters[id].default
-                        else:
-                            pass
-                    else:
-                        raise ValueError('Expression blend must be "Add" or "Overwrite"')
-                    self.persistent_exp[id] = value
+                for (slot, value) in self.expression_goals(blends, expression_name, is_fade_out).items():
+                    self.persistent_exp.set(slot, value)
+                    self.fades.cancel(slot)
             else:
-                self.fading = self.fade_and_add(renpy_model, expression_name, 'bezier', duration=fade_time, is_fade_out=is_fade_out)
-                self.fading_start_time = self.st
-                self.fading_end_time = self.st + fade_time
+                self.fade_and_add(blends, expression_name, 'bezier', duration=fade_time, is_fade_out=is_fade_out)
 
         #for expression_name, fade_in_time in self.active_expressions.expressions_dict.items():
         #    for param in self.expressions[expression_name].parameters:
         #        renpy_model.blend_parameter(param['Id'], "Overwrite", param['Value'])
-        for id, value in self.persistent_exp.items():
-            renpy_model.blend_parameter(id, "Overwrite", value)
-
-        if self.st >= self.fading_end_time:
-            if self.fading is None:
-                pass
-            else:
-                self.fading = None
-                self.fading_start_time = 0.0
-                self.fading_end_time = 0.0
-            return
+        blends.write_from(self.persistent_exp)
 
-        elif self.st >= self.fading_start_time:
-            relative_st = self.st - self.fading_start_time
-            assert self.fading
-            params = self.second(self.fading, relative_st)
-            for param in params:
-                renpy_model.blend_parameter(param['Id'], "Overwrite", param['Value'])
-            return
+        if len(self.fades) > 0:
+            self.fades.blend(blends, self.st)
+        return
 
-        else:
-            return
+    # Find the value every parameter of this expression settles on once it has been added or removed, keyed by slot
+    def expression_goals(self, renpy_model, expression_name: str, is_fade_out: bool=False) -> dict:
+        goals = dict()
+        persistent = self.persistent_exp
+        persistent.reserve(len(self.slots))
+        for entry in self.get_expression(expression_name).parameters:
+            id = entry['Id']
+            slot = self.slots.index.get(('Parameter', id))
+            if slot is None:
+                slot = self.slots.intern('Parameter', id)
+                persistent.reserve(len(self.slots))
+            if persistent.present[slot] == 0:
+                persistent.set(slot, renpy_model.common.model.parameters[id].default)
+            value = entry['Value']
+            blend = entry['Blend']
+            if blend == 'Add':
+                if is_fade_out is True:
+                    value = persistent.values[slot] - value
+                else:
+                    value = persistent.values[slot] + value
+            elif blend == 'Overwrite':
+                if is_fade_out is True:
+                    value = renpy_model.common.model.parameters[id].default
+                else:
+                    pass
+            else:
+                raise ValueError('Expression blend must be "Add" or "Overwrite"')
+            goals[slot] = value
+        return goals
 
     # Find the value of every parameter of this motion at this second
-    def second(self, motion_name: str, relative_st: float) -> list[dict]:
+    # If a cursor for this motion is given, segments are looked up from where the cursor last left off
+    def second(self, motion_name: str, relative_st: float, cursor: Cursor | None=None) -> list[dict]:
         values: list = list()
         if not isinstance(motion_name, str):
             raise TypeError('Motion name must be a string')
         elif not (isinstance(relative_st, float) or isinstance(relative_st, int)):
             raise TypeError('Seconds must be a float')
-        elif motion_name not in self.motions:
+        elif not self.has_motion(motion_name):
             raise KeyError(f'No motion with the name "{motion_name}" associated with model "{self.name}"')
         else:
-            # Find the value of every parameter of this motion at this second
-            if relative_st > self.motions[motion_name].duration:
-                # Failsafe for if relative st is greater than entire length of motion
-                relative_st = self.motions[motion_name].duration
-                
-            for curve in self.motions[motion_name].curves:
-                target = curve['Target']
-                id = curve['Id']
-                segments = curve['Segments']
-                row = 2
-                
-                loop = True
-                while(loop):
-                    if segments[row] == 0:
-                        # Linear segment
-                        if relative_st < segments[row+1] or len(segments) <= row+3:
-                            loop = False
-                        else:
-                            row += 3
-                    elif segments[row] == 1:
-                        # Bezier segment
-                        if relative_st < segments[row+5] or len(segments) <= row+7:
-                            loop = False
-                        else:
-                            row += 7
-                    elif segments[row] == 2 or segments[row] == 3:
-                        raise ValueError('Stepped and inverse-stepped segments are unsupported')
-                    else:
-                        raise ValueError('Unknown segment type')
-                    
-                p0 = (segments[row-2], segments[row-1])
-                p1 = (segments[row+1], segments[row+2])
-                if segments[row] == 1:
-                    p2 = (segments[row+3], segments[row+4])
-                    p3 = (segments[row+5], segments[row+6])
-                    value = bezier(relative_st, p0, p1, p2, p3)
-                else:
-                    value = linear(relative_st, p0, p1)
+            motion = self.get_motion(motion_name)
+            self.touch_motion(motion_name)
+            for curve, value in zip(motion.compiled, motion.values(relative_st, cursor)):
+                values.append({'Target': curve.target, 'Id': curve.id, 'Value': value})
+            for (target, id, value) in motion.constants:
                 values.append({'Target': target, 'Id': id, 'Value': value})
         return values
 
 #######################################################################################################################
 
+    # Free a transition motion once it is no longer playing or queued
+    def release_synthetic(self, motion_name: str) -> None:
+        if motion_name not in self.synthetic_motions:
+            return
+        elif self.action is not None and self.action.name == motion_name:
+            return
+        elif motion_name in self.exclusive:
+            return
+        self.synthetic_motions.pop(motion_name)
+        return
+
     # Transition from the current pose to the beginning of the provided one
-    def transition_and_push(self, motion_name: str, type: str='bezier', duration: float=0) -> None:
+    # With crossfade, the motion plays from its start right away and is blended in from the current pose instead. Type
+    # can then also be a function that maps the fraction of the crossfade that has passed to the weight of the motion.
+    # Functions are not saved with the model, so a crossfade with one that is playing or queued when the game is saved
+    # uses the bezier easing once loaded
+    def transition_and_push(self, motion_name: str, type: str='bezier', duration: float=0, crossfade: bool=False) -> None:
         global default_transition_time
         if not isinstance(motion_name, str):
             raise TypeError('Motion name must be a string')
-        elif motion_name not in self.motions:
+        elif not self.has_motion(motion_name):
             raise KeyError(f'No motion with the name "{motion_name}" associated with model "{self.name}"')
-        if not isinstance(type, str):
+        if not isinstance(crossfade, bool):
+            raise TypeError('Crossfade must be a bool')
+        elif crossfade is True and callable(type):
+            pass
+        elif not isinstance(type, str):
             raise TypeError('Type must be "linear" or "bezier"')
         elif not (type == 'linear' or type == 'bezier'):
             raise ValueError(f'"{type}" is not a valid type. Choose "linear" or "bezier"')
-        elif not (isinstance(duration, float) or isinstance(duration, int)):
+        if not (isinstance(duration, float) or isinstance(duration, int)):
             raise TypeError('Duration must be a float')
         
         if duration <= 0:
             duration = default_transition_time
 
+        # No motion is built, the blend is worked out every frame while the motion plays
+        if crossfade is True:
+            self.exclusive_push(motion_name, crossfade=(float(duration), type))
+            return
+
         # Figure out the end state
         transitions = dict()
         goal_list = self.second(motion_name, duration)
@@ -520,9 +2347,10 @@ class Model:
         # Otherwise draw curves for transition animation
         else:
             for (target, id) in transitions:
-                if (target, id) in self.persistent:
+                slot = self.slots.index.get((target, id))
+                if slot is not None and slot in self.persistent:
                     p31 = transitions[(target, id)]
-                    p01 = self.persistent[(target, id)]
+                    p01 = self.persistent.get(slot)
                     if type == 'linear':
                         transitions[(target, id)] = [0, p01, 0, duration, p31]
                     elif type == 'bezier':
@@ -538,17 +2366,17 @@ class Model:
         transition_motion_name = 'transition' + str(self.sequential_name)
         self.sequential_name += 1
         new_motion = Motion(transition_motion_name, duration, curves)
-        self.motions[transition_motion_name] = new_motion
+        self.synthetic_motions[transition_motion_name] = new_motion
         
         # Push motions to queue
         self.exclusive_push(transition_motion_name)
         self.exclusive_push(motion_name, skip_seconds=duration)
 
-    def fade_and_add(self, renpy_model, expression_name: str, type: str='bezier', duration: float=0, is_fade_out: bool=False) -> str:
+    def fade_and_add(self, renpy_model, expression_name: str, type: str='bezier', duration: float=0, is_fade_out: bool=False) -> None:
         global default_fade_time
         if not isinstance(expression_name, str):
             raise TypeError('Expression name must be a string')
-        elif expression_name not in self.expressions:
+        elif not self.has_expression(expression_name):
             raise KeyError(f'No motion with the name "{expression_name}" associated with model "{self.name}"')
         if not isinstance(type, str):
             raise TypeError('Type must be "linear" or "bezier"')
@@ -560,77 +2388,151 @@ class Model:
         if duration <= 0:
             duration = default_fade_time
 
-        fades = dict()
-        goal_list = [param for param in self.expressions[expression_name].parameters]
-        for entry in goal_list:
-            id = entry['Id']
-            if id not in self.persistent_exp:
-                self.persistent_exp[id] = renpy_model.common.model.parameters[id].default
-            value = entry['Value']
-            blend = entry['Blend']
-            if blend == 'Add':
-                if is_fade_out is True:
-                    value = self.persistent_exp[id] - value
-                else:
-                    value = self.persistent_exp[id] + value
-            elif blend == 'Overwrite':
-                if is_fade_out is True:
-                    value = renpy_model.common.model.parameters[id].default
-                else:
-                    pass
-            else:
-                raise ValueError('Expression blend must be "Add" or "Overwrite"')
-            fades[id] = value
-
-        for id in fades:
-            p31 = fades[id]
-            p01 = self.persistent_exp[id]
-            self.persistent_exp[id] = fades[id]
-            if type == 'linear':
-                fades[id] = [0, p01, 0, duration, p31]
-            elif type == 'bezier':
-                fades[id] = [0, p01, 1, duration/3, p01, duration*2/3, p31, duration, p31]
-            else:
-                raise ValueError()
-            
-        # Create a new motion and append calculated values
-        curves = list()
-        for id in fades:
-            if isinstance(fades[id], list):
-                curves.append({'Target': 'Parameter', 'Id': id, 'Segments': fades[id]})
-        fade_motion_name = 'fade' + str(self.sequential_name)
-        self.sequential_name += 1
-        new_motion = Motion(fade_motion_name, duration, curves)
-        self.motions[fade_motion_name] = new_motion
+        # Each parameter fades from the value currently shown, which is partway through a fade if one is running
+        # Every slot of the goals already has a persistent value, so it can be written in place
+        values = self.persistent_exp.values
+        for (slot, value) in self.expression_goals(renpy_model, expression_name, is_fade_out).items():
+            origin = self.fades.current(slot, self.st, values[slot])
+            values[slot] = value
+            self.fades.start(slot, origin, value, self.st, float(duration), type)
+        return
+
+#######################################################################################################################
+
+# Class for animating several models together. Every model is advanced for the same st in one pass, motions that more
+# than one model is playing at the same second are only evaluated once, and each model's blend calls are sent together.
+class Stage:
+    def __init__(self):
+        self.models: dict = dict()
+        return
+
+    def __str__(self):
+        out: str = str()
+        for model in self.models:
+            out += f'Model name: {model.name}\n'
+        return out
+
+    # Add a model to the stage. The Ren'Py Live2D model can be given now or later with bind.
+    def add(self, model: Model, renpy_model=None) -> None:
+        if not isinstance(model, Model):
+            raise TypeError('Model must be a Model')
+        self.models[model] = renpy_model
+        return
+
+    # Set the Ren'Py Live2D model a model on the stage draws to
+    def bind(self, model: Model, renpy_model) -> None:
+        if model not in self.models:
+            raise KeyError(f'Model "{model.name}" is not on the stage')
+        self.models[model] = renpy_model
+        return
 
-        return fade_motion_name
+    # Remove a model from the stage
+    def remove(self, model: Model) -> None:
+        self.models.pop(model, None)
+        return
+
+    # Call every frame to animate every model on the stage
+    # Every motion with a curve table that more than one model is playing, or that copies of are playing, is evaluated
+    # first at each of the seconds the models are at in one call. Models then take their values from those instead of
+    # evaluating the motion themselves. The work is counted by the profile of the first of the models, if it has one
+    # Returns the shortest delay any model on the stage asked for, or None if none of them need updating
+    def update(self, st: float) -> float | None:
+        global bake_cache
+        shared_values: dict = dict()
+        groups: dict = dict()
+        for model, renpy_model in self.models.items():
+            if renpy_model is None:
+                continue
+            for (motion, relative_st) in model.planned_values(st):
+                key = motion.share_key()
+                if key not in groups:
+                    groups[key] = (motion, model, list())
+                groups[key][2].append(relative_st)
+        for key, (motion, model, sts) in groups.items():
+            # Motions evaluated curve by curve gain nothing from being evaluated at many seconds at once. They are still
+            # shared between models at the same second, by whichever model evaluates them first with its cursor
+            if len(sts) < 2 or not motion.uses_table() or (motion.bake and bake_cache is not None):
+                continue
+            sts = sorted(set(sts))
+            for relative_st, values in zip(sts, motion.values_many(sts)):
+                shared_values[(key, relative_st)] = values
+            if model.profile is not None:
+                model.profile.segments += len(motion.compiled) * len(sts)
+        delays = list()
+        for model, renpy_model in self.models.items():
+            if renpy_model is None:
+                continue
+            model.shared_values = shared_values
+            try:
+                delay = model.animate(renpy_model, st)
+            finally:
+                model.shared_values = None
+            if delay is not None:
+                delays.append(delay)
+        for model, renpy_model in self.models.items():
+            if renpy_model is not None:
+                count = model.blends.flush()
+                if model.profile is not None:
+                    model.profile.add_blends(count)
+        if len(delays) <= 0:
+            return None
+        return min(delays)
 
 #######################################################################################################################
 
 # Static function
 # Load a Live2D model given its directory path
-def load_model(game_dir: str, file_name: str) -> Model:
+# A lazy model only indexes its motion and expression files. Each one is read the first time it is needed.
+# If the model folder has a motion pack written by pack_model, motions are mapped from it instead of the Motions folder.
+def load_model(game_dir: str, file_name: str, lazy: bool=False) -> Model:
     live2d_path = Path(game_dir) / 'live2d' / file_name
     # Check if directory is a Live2D model folder
     if live2d_path.is_dir() and (live2d_path / (file_name + '.model3.json')).is_file():
         # Create an empty model
         model = Model(file_name)
+        model.library = motion_library
         motions_dir = live2d_path / 'Motions'
         expressions_dir = live2d_path / 'Expressions'
+        pack_path = live2d_path / (file_name + '.l2dpack')
 
-        # Read each motion and populate the model
-        for motion_entry in motions_dir.iterdir():
-            motion_path = motions_dir / motion_entry
-            if motion_path.is_file():
-                motion = load_motion(motion_path)
-                model.motions[motion.name.split('.')[0]] = motion
+        # Index each motion in the pack and populate the model
+        # A pack older than the Motions folder or any file in it is out of date, so the files are read instead
+        if pack_path.is_file() and pack_is_current(pack_path, motions_dir):
+            pack = MotionPack(pack_path) if motion_library is None else motion_library.pack(pack_path)
+            for motion_name in pack.names():
+                model.motion_files[motion_name] = pack
+                if not lazy:
+                    model.motions[motion_name] = model.read_motion(motion_name)
 
-        # Read each expression and populate the model
+        # Index each motion and populate the model
+        else:
+            for motion_entry in motions_dir.iterdir():
+                motion_path = motions_dir / motion_entry
+                if motion_path.is_file():
+                    model.motion_files[motion_path.name.split('.')[0]] = motion_path
+                    if not lazy:
+                        motion = model.read_motion(motion_path.name.split('.')[0])
+                        model.motions[motion.name.split('.')[0]] = motion
+
+        # Index each expression and populate the model
         for expression_entry in expressions_dir.iterdir():
             expression_path = expressions_dir / expression_entry
             if expression_path.is_file():
-                expression = load_expression(expression_path)
-                model.expressions[expression.name.split('.')[0]] = expression
+                model.expression_files[expression_path.name.split('.')[0]] = expression_path
+                if not lazy:
+                    expression = model.read_expression(expression_path.name.split('.')[0])
+                    model.expressions[expression.name.split('.')[0]] = expression
+    
+        # Give every parameter and part the loaded motions and expressions use a slot
+        for motion in model.motions.values():
+            model.slots.motion(motion)
+        for expression in model.expressions.values():
+            for entry in expression.parameters:
+                model.slots.intern('Parameter', entry['Id'])
+
+        # Count the loaded motions against the motion budget
+        for motion_name in list(model.motions):
+            model.touch_motion(motion_name)
     
     # Folder not found or Live2D files not found
     else:
@@ -640,19 +2542,203 @@ def load_model(game_dir: str, file_name: str) -> Model:
 # Static function
 # Load a Live2D motion given its directory path
 def load_motion(file_path: Path) -> Motion:
+    global simplify_tolerance
+    source = file_key(file_path) + (simplify_tolerance,)
+    motion = read_parse_cache(file_path)
+    if isinstance(motion, Motion):
+        motion.source = source
+        return motion
     with open(file_path, 'r') as file:
         data = json.load(file, parse_int=float)
-        motion = Motion(file_path.name.split('.')[0], data['Meta']['Duration'], data['Curves'])
+        motion = Motion(file_path.name.split('.')[0], data['Meta']['Duration'], data['Curves'],
+                        restricted=bool(data['Meta'].get('AreBeziersRestricted', False)))
+    if simplify_tolerance is not None:
+        motion.simplify(simplify_tolerance)
+    motion.source = source
+    write_parse_cache(file_path, motion)
     return motion
 
 # Static function
 # Load a Live2D expression given its directory path
 def load_expression(file_path: Path) -> Expression:
+    expression = read_parse_cache(file_path)
+    if isinstance(expression, Expression):
+        return expression
     with open(file_path, 'r') as file:
         data = json.load(file, parse_int=float)
         expression = Expression(file_path.name.split('.')[0], data['Parameters'])
+    write_parse_cache(file_path, expression)
     return expression
 
+# Static function
+# Write motions to a motion pack file
+def write_pack(motions: list[Motion], file_path: str | Path) -> None:
+    global pack_magic
+    if not isinstance(motions, list):
+        raise TypeError('Motions must be a list')
+    entries = list()
+    data = bytearray()
+    for motion in motions:
+        curves = list()
+        for curve in motion.compiled:
+            arrays = dict()
+            for (key, values, typecode) in (('Times', curve.times, 'd'), ('Points', curve.points, 'd'),
+                                            ('Coefficients', curve.coefficients, 'd'), ('Offsets', curve.offsets, 'Q'),
+                                            ('Kinds', curve.kinds, 'b')):
+                # Keep every array 8-byte aligned
+                data.extend(bytes(-len(data) % 8))
+                arrays[key] = len(data)
+                data.extend(array(typecode, values).tobytes())
+            curves.append({'Target': curve.target, 'Id': curve.id, 'Count': len(curve), 'PointCount': len(curve.points), **arrays})
+        entries.append({'Name': motion.name, 'Duration': motion.duration, 'Curves': curves,
+                        'Constants': [list(constant) for constant in motion.constants], 'Simplified': motion.simplified})
+    index = json.dumps({'ByteOrder': sys.byteorder, 'Motions': entries}).encode('utf-8')
+    # Write to a temporary file first and move it into place, so models that have the old pack mapped keep reading it
+    # instead of the file being cut short under them
+    file_path = Path(file_path)
+    (handle, temporary_path) = tempfile.mkstemp(dir=file_path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'wb') as file:
+            file.write(pack_magic)
+            file.write(len(index).to_bytes(8, 'little'))
+            file.write(index)
+            file.write(bytes(-(16 + len(index)) % 8))
+            file.write(data)
+        os.replace(temporary_path, file_path)
+    except BaseException:
+        Path(temporary_path).unlink(missing_ok=True)
+        raise
+    return
+
+# Static function
+# Returns True if a motion pack was written after every change to a Motions folder. Adding or removing a file changes
+# the time of the folder itself. Packs shipped without a Motions folder are always current
+def pack_is_current(pack_path: Path, motions_dir: Path) -> bool:
+    if not motions_dir.is_dir():
+        return True
+    newest = motions_dir.stat().st_mtime_ns
+    for motion_path in motions_dir.iterdir():
+        if motion_path.is_file():
+            newest = max(newest, motion_path.stat().st_mtime_ns)
+    return pack_path.stat().st_mtime_ns >= newest
+
+# Static function
+# Write a motion pack of every motion in a Live2D model's Motions folder. Returns the path of the pack.
+def pack_model(game_dir: str, file_name: str, file_path: str | Path | None=None) -> Path:
+    live2d_path = Path(game_dir) / 'live2d' / file_name
+    motions_dir = live2d_path / 'Motions'
+    if not motions_dir.is_dir():
+        raise OSError(f'{motions_dir} is not a valid path')
+    if file_path is None:
+        file_path = live2d_path / (file_name + '.l2dpack')
+    motions = list()
+    for motion_entry in sorted(motions_dir.iterdir()):
+        motion_path = motions_dir / motion_entry
+        if motion_path.is_file():
+            motions.append(load_motion(motion_path))
+    write_pack(motions, file_path)
+    return Path(file_path)
+
+# Static function
+# Set the directory parsed motions and expressions are cached in, or None to always parse the JSON files
+def set_parse_cache(directory: str | Path | None) -> None:
+    global parse_cache_dir
+    if directory is None:
+        parse_cache_dir = None
+    elif not (isinstance(directory, str) or isinstance(directory, Path)):
+        raise TypeError('Directory must be a string or a path')
+    else:
+        parse_cache_dir = Path(directory)
+        parse_cache_dir.mkdir(parents=True, exist_ok=True)
+    return
+
+# Static function
+# Delete every entry in the parse cache
+def clear_parse_cache() -> None:
+    global parse_cache_dir
+    if parse_cache_dir is None:
+        return
+    for entry in parse_cache_dir.glob('*.l2dcache'):
+        entry.unlink(missing_ok=True)
+    return
+
+# Static function
+# Returns the parse cache entry and header for a file. Entries are keyed by path and invalidated by size and mtime.
+def parse_cache_entry(file_path: Path) -> tuple[Path, tuple] | None:
+    global parse_cache_dir, parse_cache_version, simplify_tolerance
+    if parse_cache_dir is None:
+        return None
+    key = file_key(file_path)
+    return (parse_cache_dir / (hashlib.sha1(key[0].encode('utf-8')).hexdigest() + '.l2dcache'),
+            (parse_cache_version,) + key + (simplify_tolerance,))
+
+# Static function
+# Returns the resolved path, size and modification time of a file, which change whenever the file is replaced or edited
+def file_key(file_path: str | Path) -> tuple:
+    path = Path(file_path).resolve()
+    stat = path.stat()
+    return (str(path), stat.st_size, stat.st_mtime_ns)
+
+# Static function
+# Read a parsed motion or expression from the parse cache. Returns None if there is no up to date entry.
+def read_parse_cache(file_path: Path) -> Motion | Expression | None:
+    entry = parse_cache_entry(file_path)
+    if entry is None:
+        return None
+    (entry_path, header) = entry
+    try:
+        with open(entry_path, 'rb') as file:
+            if pickle.load(file) != header:
+                # Stale entry, the file has changed since it was cached
+                return None
+            return pickle.load(file)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ValueError):
+        return None
+
+# Static function
+# Write a parsed motion or expression to the parse cache
+def write_parse_cache(file_path: Path, value: Motion | Expression) -> None:
+    entry = parse_cache_entry(file_path)
+    if entry is None:
+        return
+    (entry_path, header) = entry
+    # Write to a temporary file first so a reader never sees a half written entry
+    (handle, temporary_path) = tempfile.mkstemp(dir=entry_path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'wb') as file:
+            pickle.dump(header, file, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(value, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, entry_path)
+    except OSError:
+        Path(temporary_path).unlink(missing_ok=True)
+    return
+
+# Static function
+# Share motions, expressions and motion packs between models loaded from the same files from now on. Models that are
+# already loaded keep what they have
+def set_motion_library(enabled: bool) -> None:
+    global motion_library
+    if not isinstance(enabled, bool):
+        raise TypeError('Enabled must be a bool')
+    if not enabled:
+        motion_library = None
+    elif motion_library is None:
+        motion_library = MotionLibrary()
+    return
+
+# Static function
+# Set how many background threads read queued motions and expressions ahead of time, or 0 to read them when needed
+def set_prefetch_workers(workers: int) -> None:
+    global prefetch_pool
+    if not isinstance(workers, int):
+        raise TypeError('Workers must be an int')
+    elif workers < 0:
+        raise ValueError('Workers must not be negative')
+    if prefetch_pool is not None:
+        prefetch_pool.shutdown(wait=False)
+    prefetch_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='rpyl2dp') if workers > 0 else None
+    return
+
 # Static function
 # Set the default fade duration
 def set_fade_default_time(duration: float) -> None:
@@ -671,6 +2757,107 @@ def set_transition_default_time(duration: float) -> None:
     default_transition_time = float(duration)
     return
 
+# Static function
+# Enable or disable letting models sleep until their next visible change instead of updating every frame
+# Ren'Py is not told about motions or expressions queued while a model sleeps, so a maximum delay can be given to bound how
+# long those take to start. None lets a model with nothing scheduled sleep until it is redrawn for another reason.
+def set_adaptive_redraw(enabled: bool, max_delay: float | None=None) -> None:
+    global adaptive_redraw, max_redraw_delay
+    if not isinstance(enabled, bool):
+        raise TypeError('Enabled must be a bool')
+    elif not (max_delay is None or isinstance(max_delay, float) or isinstance(max_delay, int)):
+        raise TypeError('Maximum delay must be a float or None')
+    adaptive_redraw = enabled
+    max_redraw_delay = None if max_delay is None else float(max_delay)
+    return
+
+# Static function
+# Enable or disable skipping blends whose value has not changed since the last frame
+# Only enable this if the renderer keeps parameter values between frames, otherwise skipped parameters revert to defaults
+def set_skip_unchanged(enabled: bool) -> None:
+    global skip_unchanged_blends
+    if not isinstance(enabled, bool):
+        raise TypeError('Enabled must be a bool')
+    skip_unchanged_blends = enabled
+    return
+
+# Static function
+# Set the cache baked motions are read from, or None to stop reading from baked tables
+def set_bake_cache(cache: BakeCache | None) -> None:
+    global bake_cache
+    if not (cache is None or isinstance(cache, BakeCache)):
+        raise TypeError('Cache must be a BakeCache or None')
+    bake_cache = cache
+    return
+
+# Static function
+# Simplify motions as they are loaded, folding constant curves and dropping keyframes within the tolerance of a straight
+# line. Motions that are already loaded are not changed
+def set_simplify(enabled: bool, tolerance: float=0.0) -> None:
+    global simplify_tolerance
+    if not isinstance(enabled, bool):
+        raise TypeError('Enabled must be a bool')
+    elif not (isinstance(tolerance, float) or isinstance(tolerance, int)):
+        raise TypeError('Tolerance must be a float')
+    elif tolerance < 0:
+        raise ValueError('Tolerance must not be negative')
+    simplify_tolerance = float(tolerance) if enabled else None
+    return
+
+# Static function
+# Keep the motions every model loads under a budget, unloading the least recently used ones that are not in use. Motions
+# that are already loaded are counted the next time they are used
+def set_motion_budget(budget: MotionBudget | None) -> None:
+    global motion_budget
+    if not (budget is None or isinstance(budget, MotionBudget)):
+        raise TypeError('Budget must be a MotionBudget or None')
+    motion_budget = budget
+    return
+
+# Static function
+# Enable or disable evaluating motions with NumPy
+def set_numpy_backend(enabled: bool, min_curves: int=16) -> None:
+    global numpy_backend, numpy_min_curves
+    if not isinstance(enabled, bool):
+        raise TypeError('Enabled must be a bool')
+    elif not isinstance(min_curves, int):
+        raise TypeError('Minimum curves must be an int')
+    elif enabled and numpy is None:
+        raise ImportError('NumPy is not installed')
+    numpy_backend = enabled
+    numpy_min_curves = min_curves
+    return
+
+# Static function
+# Only named easings are saved, as functions such as lambdas cannot be pickled. Any other easing is saved as bezier
+def saved_easing(easing):
+    if isinstance(easing, str):
+        return easing
+    return 'bezier'
+
+# Static function
+# Returns a crossfade of duration and easing with its easing as it is saved
+def saved_crossfade(crossfade: tuple | None) -> tuple | None:
+    if crossfade is None:
+        return None
+    (duration, easing) = crossfade
+    return (duration, saved_easing(easing))
+
+# Static function
+# Weight of a transition once the fraction u of it has passed. The bezier easing is the curve with its handles flat at
+# both ends that transitions are drawn with. Any other type is a function of u
+def ease(type, u: float) -> float:
+    if u <= 0.0:
+        return 0.0
+    elif u >= 1.0:
+        return 1.0
+    elif type == 'linear':
+        return u
+    elif type == 'bezier':
+        return u * u * (3.0 - 2.0 * u)
+    else:
+        return type(u)
+
 # Static function
 # Solve for y given st (x) in a linear equation
 def linear(st: float, p0: tuple[float, float], p1: tuple[float, float]) -> float:
@@ -682,7 +2869,36 @@ def linear(st: float, p0: tuple[float, float], p1: tuple[float, float]) -> float
 # Static function
 # Solve for y given st (x) in a cubic bezier
 def bezier(st: float, p0: tuple[float, float], p1: tuple[float, float], p2: tuple[float, float], p3: tuple[float, float]) -> float:
-    # Normalise st to t
-    t = (st-p0[0]) / (p3[0]-p0[0])
+    ax = p3[0] - p0[0] + 3*(p1[0]-p2[0])
+    bx = 3*(p0[0] - 2*p1[0] + p2[0])
+    if abs(ax) + abs(bx) <= 1e-9 * abs(p3[0]-p0[0]):
+        # Normalise st to t
+        t = (st-p0[0]) / (p3[0]-p0[0])
+    else:
+        t = bezier_time(st, ax, bx, 3*(p1[0]-p0[0]), p0[0])
     y = (1-t)**3 * p0[1] + 3*t*(1-t)**2 * p1[1] + 3*(1-t)*t**2 * p2[1] + t**3 * p3[1]
-    return y
\ No newline at end of file
+    return y
+
+# Static function
+# Solve for t given st (x) in a cubic bezier whose x is ax*t^3 + bx*t^2 + cx*t + dx
+# Newton's method starts from where t would be if x were linear, and falls back to bisection if a step leaves the bracket
+def bezier_time(st: float, ax: float, bx: float, cx: float, dx: float) -> float:
+    t = (st-dx) / (ax+bx+cx)
+    if t <= 0.0:
+        return 0.0
+    elif t >= 1.0:
+        return 1.0
+    low = 0.0
+    high = 1.0
+    for i in range(bezier_time_iterations):
+        error = ((ax*t + bx)*t + cx)*t + dx - st
+        if -1e-12 < error < 1e-12:
+            break
+        elif error > 0.0:
+            high = t
+        else:
+            low = t
+        slope = (3*ax*t + 2*bx)*t + cx
+        step = t - error/slope if slope > 0.0 else -1.0
+        t = step if low < step < high else (low+high) / 2
+    return t
\ No newline at end of file
@@ -0,0 +1,14 @@
+from types import SimpleNamespace
+
+# Class for the parameters of a fake Ren'Py Live2D model. Only the default value is read by rpyl2dp.
+class FakeParameter:
+    def __init__(self, default: float=0.0):
+        if not (isinstance(default, float) or isinstance(default, int)):
+            raise TypeError('Default must be a float')
+        self.default: float = float(default)
+        return
+
+# Static function
+# Returns the part of a Ren'Py Live2D model rpyl2dp reads, which is the default value of each parameter
+def fake_common(parameters: dict) -> SimpleNamespace:
+    return SimpleNamespace(model=SimpleNamespace(parameters={id: FakeParameter(default) for id, default in parameters.items()}))
@@ -0,0 +1,163 @@
+from array import array
+from pathlib import Path
+from typing import Iterator
+import json
+import sys
+
+from . import rpyl2dp as l2d
+from .standin import fake_common
+
+timeline_magic = b'L2DTIME1'
+
+# Class standing in for a Ren'Py Live2D model while rendering a timeline. Every parameter and part opacity is a fixed
+# column, and the value of each column this frame is kept in one flat array. Columns nothing was blended to this frame
+# hold their default, like a Ren'Py Live2D model does.
+class RecordingSink:
+    def __init__(self, parameters: dict | list, parts: dict | list | None=None):
+        if isinstance(parameters, list):
+            parameters = {id: 0.0 for id in parameters}
+        elif not isinstance(parameters, dict):
+            raise TypeError('Parameters must be a dict or a list')
+        if parts is None:
+            parts = dict()
+        elif isinstance(parts, list):
+            parts = {id: 1.0 for id in parts}
+        elif not isinstance(parts, dict):
+            raise TypeError('Parts must be a dict or a list')
+        self.common = fake_common(parameters)
+        self.columns: list[tuple[str, str]] = [('Parameter', id) for id in parameters] + [('PartOpacity', id) for id in parts]
+        self.parameter_index: dict = {id: number for number, id in enumerate(parameters)}
+        self.part_index: dict = {id: len(parameters) + number for number, id in enumerate(parts)}
+        self.defaults: array = array('d', list(parameters.values()) + list(parts.values()))
+        self.values: array = array('d', self.defaults)
+        return
+
+    # Make a sink with a column for every parameter and part opacity any motion or expression of the model sets
+    # Every motion and expression is loaded to find them. Defaults not given are 0 for parameters and 1 for parts
+    @classmethod
+    def for_model(cls, model: l2d.Model, defaults: dict | None=None) -> 'RecordingSink':
+        if defaults is None:
+            defaults = dict()
+        parameters: dict = dict()
+        parts: dict = dict()
+        for motion_name in model.motion_names():
+            motion = model.get_motion(motion_name)
+            targets = [(curve.target, curve.id) for curve in motion.compiled]
+            targets += [(target, id) for (target, id, value) in motion.constants]
+            for (target, id) in targets:
+                if target == 'Parameter':
+                    parameters.setdefault(id, float(defaults.get(id, 0.0)))
+                elif target == 'PartOpacity':
+                    parts.setdefault(id, float(defaults.get(id, 1.0)))
+        for expression_name in model.expression_names():
+            for entry in model.get_expression(expression_name).parameters:
+                parameters.setdefault(entry['Id'], float(defaults.get(entry['Id'], 0.0)))
+        return cls(parameters, parts)
+
+    def blend_parameter(self, id: str, blend: str, value: float) -> None:
+        if blend != 'Overwrite':
+            raise ValueError('Recording sinks only accept "Overwrite" blends')
+        elif id not in self.parameter_index:
+            raise KeyError(f'No column for the parameter "{id}"')
+        self.values[self.parameter_index[id]] = value
+        return
+
+    def blend_opacity(self, id: str, blend: str, value: float) -> None:
+        if blend != 'Overwrite':
+            raise ValueError('Recording sinks only accept "Overwrite" blends')
+        elif id not in self.part_index:
+            raise KeyError(f'No column for the part "{id}"')
+        self.values[self.part_index[id]] = value
+        return
+
+    # Set every column back to its default for a new frame
+    def reset(self) -> None:
+        self.values[:] = self.defaults
+        return
+
+    # Returns the names of the columns, as Target:Id
+    def names(self) -> list[str]:
+        return [f'{target}:{id}' for (target, id) in self.columns]
+
+# Drive a model from start to end at the given frame rate and yield the time and the value of every column of each frame.
+# Frames are made one at a time as they are asked for, so memory does not grow with the length of the timeline.
+# The model is driven through the same stages as Model.update, so the exclusive queue, inclusive timers and expression
+# fades all play out. Values are read from the model's blend buffer directly, so skipping unchanged blends has no effect
+def iter_frames(model: l2d.Model, start: float=0.0, end: float | None=None, fps: float | None=None,
+                sink: RecordingSink | None=None) -> Iterator[tuple[float, array]]:
+    if not isinstance(model, l2d.Model):
+        raise TypeError('Model must be a Model')
+    elif not (isinstance(start, float) or isinstance(start, int)):
+        raise TypeError('Start must be a float')
+    elif not (end is None or isinstance(end, float) or isinstance(end, int)):
+        raise TypeError('End must be a float')
+    elif not (fps is None or isinstance(fps, float) or isinstance(fps, int)):
+        raise TypeError('FPS must be a float')
+    if fps is None:
+        fps = l2d.FPS
+    elif fps <= 0:
+        raise ValueError('FPS must be positive')
+    if sink is None:
+        sink = RecordingSink.for_model(model)
+    blends = model.blends
+    number = 0
+    while True:
+        st = start + number / fps
+        # Frames are taken up to but not including end, allowing for rounding in st
+        if end is not None and st >= end - 1e-9 / fps:
+            return
+        sink.reset()
+        model.animate(sink, st)
+        blends.send(sink)
+        yield (st, array('d', sink.values))
+        number += 1
+
+# Render a timeline to a file one frame at a time. CSV files have a header row of st followed by the column names.
+# Binary files start with the timeline magic, the length of a JSON header and the header, followed by one row of doubles
+# per frame in the same layout as the CSV. Returns the number of frames written
+def export_frames(model: l2d.Model, file_path: str | Path, start: float=0.0, end: float=10.0, fps: float | None=None,
+                  format: str='csv', sink: RecordingSink | None=None) -> int:
+    if not (format == 'csv' or format == 'binary'):
+        raise ValueError(f'"{format}" is not a valid format. Choose "csv" or "binary"')
+    if fps is None:
+        fps = l2d.FPS
+    if sink is None:
+        sink = RecordingSink.for_model(model)
+    count = 0
+    if format == 'csv':
+        with open(file_path, 'w', newline='') as file:
+            file.write(','.join(['st'] + sink.names()) + '\n')
+            for (st, values) in iter_frames(model, start, end, fps, sink):
+                file.write(','.join([repr(st)] + [repr(value) for value in values]) + '\n')
+                count += 1
+    else:
+        header = json.dumps({'ByteOrder': sys.byteorder, 'Columns': ['st'] + sink.names(), 'FPS': fps, 'Start': start}).encode('utf-8')
+        with open(file_path, 'wb') as file:
+            file.write(timeline_magic)
+            file.write(len(header).to_bytes(8, 'little'))
+            file.write(header)
+            row = array('d')
+            for (st, values) in iter_frames(model, start, end, fps, sink):
+                row.append(st)
+                row.extend(values)
+                row.tofile(file)
+                del row[:]
+                count += 1
+    return count
+
+# Read a binary timeline back one frame at a time. Yields the time and the value of every column of each frame
+def read_frames(file_path: str | Path) -> Iterator[tuple[float, array]]:
+    with open(file_path, 'rb') as file:
+        if file.read(len(timeline_magic)) != timeline_magic:
+            raise ValueError(f'{file_path} is not a timeline file')
+        header = json.loads(file.read(int.from_bytes(file.read(8), 'little')).decode('utf-8'))
+        width = len(header['Columns'])
+        while True:
+            row = array('d')
+            try:
+                row.fromfile(file, width)
+            except EOFError:
+                return
+            if header['ByteOrder'] != sys.byteorder:
+                row.byteswap()
+            yield (row[0], row[1:])
@@ -0,0 +1,34 @@
+import json
+
+import rpyl2dp.rpyl2dp as l2d
+from rpyl2dp.bench import FakeRenpyModel
+
+# Write a model folder with one motion that moves P from 0 to 1 over a second
+def write_model(tmp_path):
+    live2d_path = tmp_path / 'live2d' / 'model'
+    (live2d_path / 'Motions').mkdir(parents=True)
+    (live2d_path / 'Expressions').mkdir()
+    (live2d_path / 'model.model3.json').write_text(json.dumps({'Version': 3, 'FileReferences': {}}))
+    motion = {'Version': 3, 'Meta': {'Duration': 1.0, 'Fps': 30.0, 'Loop': True, 'CurveCount': 1},
+              'Curves': [{'Target': 'Parameter', 'Id': 'P', 'Segments': [0, 0, 0, 1, 1]}]}
+    (live2d_path / 'Motions' / 'a.motion3.json').write_text(json.dumps(motion))
+    return l2d.load_model(str(tmp_path), 'model')
+
+# Timers left by a motion that was removed do not start or end it once it is added again
+def test_inclusive_remove_then_add(tmp_path):
+    model = write_model(tmp_path)
+    renpy_model = FakeRenpyModel(['P'])
+    model.inclusive_add('a', 0.5, 0.5)
+    model.update(renpy_model, 0.1)
+    model.inclusive_remove('a')
+    model.inclusive_add('a', 2.0, 2.0)
+    for st in (0.2, 0.7, 1.0, 1.7, 2.1):
+        renpy_model.clear()
+        model.update(renpy_model, st)
+        assert model.inclusive.playing == list()
+        assert renpy_model.calls == list()
+    renpy_model.clear()
+    model.update(renpy_model, 2.5)
+    assert model.inclusive.playing == ['a']
+    assert [call[1] for call in renpy_model.calls] == ['P']
+    assert 0.0 <= renpy_model.calls[0][3] <= 1.0
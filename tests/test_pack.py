@@ -0,0 +1,55 @@
+import os
+
+import pytest
+
+import rpyl2dp.rpyl2dp as l2d
+from rpyl2dp.bench import generate_model
+
+@pytest.fixture(params=[False, True], ids=['python', 'numpy'])
+def numpy_backend(request):
+    if request.param and l2d.numpy is None:
+        pytest.skip('NumPy is not installed')
+    previous = (l2d.numpy_backend, l2d.numpy_min_curves)
+    l2d.set_numpy_backend(request.param, 1)
+    yield request.param
+    l2d.set_numpy_backend(*previous)
+
+@pytest.fixture
+def game_dir(tmp_path):
+    generate_model(tmp_path, 'model', motions=4, curves=20, keyframes=30, seed=1)
+    return tmp_path
+
+# second gives the same values whether motions are read from their JSON files or from a motion pack
+def test_pack_round_trip(game_dir, numpy_backend):
+    files = l2d.load_model(str(game_dir), 'model')
+    l2d.pack_model(str(game_dir), 'model')
+    packed = l2d.load_model(str(game_dir), 'model')
+    assert all(isinstance(source, l2d.MotionPack) for source in packed.motion_files.values())
+    assert sorted(packed.motion_names()) == sorted(files.motion_names())
+    for motion_name in files.motion_names():
+        duration = files.get_motion(motion_name).duration
+        for step in range(41):
+            st = duration * step / 40
+            assert packed.second(motion_name, st) == files.second(motion_name, st)
+
+# Rebuilding a pack leaves models that have the old pack mapped reading the old pack
+def test_pack_rebuilt_while_mapped(game_dir, numpy_backend):
+    l2d.pack_model(str(game_dir), 'model')
+    model = l2d.load_model(str(game_dir), 'model')
+    motions_dir = game_dir / 'live2d' / 'model' / 'Motions'
+    expected = l2d.load_motion(motions_dir / 'motion3.motion3.json').values(1.0)
+    for motion_name in ('motion0', 'motion1'):
+        (motions_dir / f'{motion_name}.motion3.json').unlink()
+    l2d.pack_model(str(game_dir), 'model')
+    # The motion has not been evaluated yet, so its values are read from the old mapping now
+    assert model.get_motion('motion3').values(1.0) == expected
+    assert sorted(l2d.load_model(str(game_dir), 'model').motion_names()) == ['motion2', 'motion3']
+
+# A pack older than the files in the Motions folder is passed over for the files
+def test_pack_out_of_date(game_dir):
+    pack_path = l2d.pack_model(str(game_dir), 'model')
+    motion_path = game_dir / 'live2d' / 'model' / 'Motions' / 'motion0.motion3.json'
+    stat = pack_path.stat()
+    os.utime(motion_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    model = l2d.load_model(str(game_dir), 'model')
+    assert model.motion_files['motion0'] == motion_path
@@ -0,0 +1,46 @@
+import pickle
+
+import rpyl2dp.rpyl2dp as l2d
+from rpyl2dp.bench import FakeRenpyModel, generate_model
+
+def load(tmp_path):
+    ids = generate_model(tmp_path, 'model', motions=4, curves=30, keyframes=40, seed=2)
+    return (l2d.load_model(str(tmp_path), 'model'), ids)
+
+# Returns the blend calls of a model for every frame from start for the given number of frames
+def frames(model, ids, start, count):
+    renpy_model = FakeRenpyModel(ids)
+    calls = list()
+    for frame in range(count):
+        model.update(renpy_model, start + frame / 30)
+        calls.append(list(renpy_model.calls))
+        renpy_model.clear()
+    return calls
+
+# A model saved in the middle of a transition is far smaller than the motions it plays, and plays on the same once loaded
+def test_pickle_mid_transition(tmp_path):
+    (model, ids) = load(tmp_path)
+    model.exclusive_push('motion0', loop=True)
+    model.inclusive_add('motion1', 0.0, 0.0)
+    frames(model, ids, 0.0, 30)
+    model.transition_and_push('motion2', duration=1.0)
+    model.exclusive_skip()
+    frames(model, ids, 1.0, 15)
+    assert model.action.name in model.synthetic_motions
+    data = pickle.dumps(model)
+    assert len(data) * 10 < len(pickle.dumps(model.motions))
+    loaded = pickle.loads(data)
+    assert frames(loaded, ids, 1.5, 90) == frames(model, ids, 1.5, 90)
+
+# Easing functions are not saved, a crossfade with one is loaded with the bezier easing
+def test_pickle_mid_crossfade_with_function(tmp_path):
+    (model, ids) = load(tmp_path)
+    model.exclusive_push('motion0', loop=True)
+    frames(model, ids, 0.0, 30)
+    model.transition_and_push('motion1', type=lambda u: u, duration=1.0, crossfade=True)
+    model.transition_and_push('motion2', type=lambda u: u, duration=1.0, crossfade=True)
+    model.exclusive_skip()
+    frames(model, ids, 1.0, 15)
+    loaded = pickle.loads(pickle.dumps(model))
+    assert loaded.action_crossfade[3] == 'bezier'
+    assert [entry[4] for entry in loaded.exclusive.entries()] == [(1.0, 'bezier')]
@@ -0,0 +1,28 @@
+import json
+
+import rpyl2dp.rpyl2dp as l2d
+from rpyl2dp.bench import FakeRenpyModel
+
+# Write a model folder with one motion whose curve has a keyframe every quarter of a second
+def write_model(tmp_path):
+    live2d_path = tmp_path / 'live2d' / 'model'
+    (live2d_path / 'Motions').mkdir(parents=True)
+    (live2d_path / 'Expressions').mkdir()
+    (live2d_path / 'model.model3.json').write_text(json.dumps({'Version': 3, 'FileReferences': {}}))
+    motion = {'Version': 3, 'Meta': {'Duration': 1.0, 'Fps': 30.0, 'Loop': True, 'CurveCount': 1},
+              'Curves': [{'Target': 'Parameter', 'Id': 'P', 'Segments': [0, 0, 0, 0.25, 1, 0, 0.5, 0, 0, 0.75, 1, 0, 1, 0]}]}
+    (live2d_path / 'Motions' / 'a.motion3.json').write_text(json.dumps(motion))
+    return l2d.load_model(str(tmp_path), 'model')
+
+# Playing through a motion with a cursor only steps to each segment once
+def test_profile_counts_segment_steps(tmp_path):
+    model = write_model(tmp_path)
+    renpy_model = FakeRenpyModel(['P'])
+    model.enable_profiling()
+    model.exclusive_push('a', loop=False)
+    for frame in range(30):
+        model.update(renpy_model, frame / 30)
+    stats = model.profile.snapshot()
+    # The motion starts on the first frame and is evaluated from the second
+    assert stats['curves']['Total'] == 29
+    assert stats['segments']['Total'] == 3
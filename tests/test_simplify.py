@@ -0,0 +1,11 @@
+import rpyl2dp.rpyl2dp as l2d
+
+# Linear keyframes at repeated times jump at that time, and simplifying keeps the jumps
+def test_simplify_repeated_keyframe_times():
+    curves = [{'Target': 'Parameter', 'Id': 'Param', 'Segments': [0, 0, 0, 1, 5, 0, 1, 6, 0, 1, 7, 0, 2, 0]}]
+    motion = l2d.Motion('motion', 2.0, curves)
+    simplified = l2d.Motion('motion', 2.0, curves)
+    simplified.simplify(0.0)
+    for st in (0.0, 0.5, 1.0, 1.5, 2.0):
+        assert simplified.values(st) == motion.values(st)
+    assert [motion.values(st)[0] for st in (0.5, 1.0, 1.5)] == [2.5, 7.0, 3.5]
@@ -0,0 +1,85 @@
+import pytest
+
+import rpyl2dp.rpyl2dp as l2d
+from rpyl2dp.bench import FakeRenpyModel, generate_model
+
+# Models on a stage that play copies of the same motion file with different curves must each get their own values
+def test_stage_keeps_copies_of_a_motion_apart(tmp_path):
+    ids = generate_model(tmp_path, 'model', motions=2, curves=20, keyframes=10, bezier_ratio=0.0)
+    plain = l2d.load_model(str(tmp_path), 'model')
+    l2d.set_simplify(True, 0.5)
+    try:
+        simplified = l2d.load_model(str(tmp_path), 'model')
+        alone = l2d.load_model(str(tmp_path), 'model')
+    finally:
+        l2d.set_simplify(False)
+    stage = l2d.Stage()
+    stage.add(plain, FakeRenpyModel(ids))
+    renpy_model = FakeRenpyModel(ids)
+    stage.add(simplified, renpy_model)
+    renpy_alone = FakeRenpyModel(ids)
+    for model in (plain, simplified, alone):
+        model.exclusive_push('motion0', loop=True)
+    for frame in range(60):
+        stage.update(frame / 30)
+        alone.update(renpy_alone, frame / 30)
+    assert renpy_model.calls == renpy_alone.calls
+
+# Models loaded on their own from the same folder share the work of a motion they play at the same second
+def test_stage_shares_work_between_models(tmp_path):
+    ids = generate_model(tmp_path, 'model', motions=2, curves=20, keyframes=30)
+    stage = l2d.Stage()
+    models = [l2d.load_model(str(tmp_path), 'model') for number in range(4)]
+    alone = l2d.load_model(str(tmp_path), 'model')
+    renpy_alone = FakeRenpyModel(ids)
+    for model in models + [alone]:
+        model.enable_profiling()
+        model.exclusive_push('motion0', loop=True)
+    for model in models:
+        stage.add(model, FakeRenpyModel(ids))
+    for frame in range(60):
+        stage.update(frame / 30)
+        alone.update(renpy_alone, frame / 30)
+    assert sum(model.profile.totals['segments'] for model in models) == alone.profile.totals['segments']
+    assert all(model.profile.totals['segments'] == 0 for model in models[1:])
+
+# Models playing a motion at different seconds have it evaluated for all of them in one call, with the same values they
+# get on their own
+def test_stage_batches_models_at_different_seconds(tmp_path, monkeypatch):
+    if l2d.numpy is None:
+        pytest.skip('NumPy is not installed')
+    monkeypatch.setattr(l2d, 'numpy_backend', True)
+    monkeypatch.setattr(l2d, 'numpy_min_curves', 1)
+    calls = {'evaluate': 0, 'evaluate_many': 0}
+    for name in calls:
+        def counted(self, st, method=getattr(l2d.CurveTable, name), name=name):
+            calls[name] += 1
+            return method(self, st)
+        monkeypatch.setattr(l2d.CurveTable, name, counted)
+    ids = generate_model(tmp_path, 'model', motions=2, curves=20, keyframes=30)
+    stage = l2d.Stage()
+    pairs = list()
+    for number in range(4):
+        (model, alone) = (l2d.load_model(str(tmp_path), 'model'), l2d.load_model(str(tmp_path), 'model'))
+        (renpy_model, renpy_alone) = (FakeRenpyModel(ids), FakeRenpyModel(ids))
+        stage.add(model, renpy_model)
+        pairs.append((model, renpy_model, alone, renpy_alone))
+    for frame in range(90):
+        st = frame / 30
+        for (number, (model, renpy_model, alone, renpy_alone)) in enumerate(pairs):
+            if frame == number:
+                model.exclusive_push('motion0', loop=True)
+                alone.exclusive_push('motion0', loop=True)
+        if frame == len(pairs):
+            calls['evaluate'] = 0
+            calls['evaluate_many'] = 0
+        stage.update(st)
+        for (model, renpy_model, alone, renpy_alone) in pairs:
+            alone.update(renpy_alone, st)
+        for (model, renpy_model, alone, renpy_alone) in pairs:
+            assert renpy_model.calls == renpy_alone.calls
+            renpy_model.clear()
+            renpy_alone.clear()
+    # Once every model has started, only the models updated on their own evaluate the motion one second at a time
+    assert calls['evaluate_many'] == 90 - len(pairs)
+    assert calls['evaluate'] == len(pairs) * (90 - len(pairs))